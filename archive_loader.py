@@ -0,0 +1,161 @@
+import os
+
+import pandas as pd
+
+from visualizer import compute_transitions
+
+ARCHIVE_COLUMNS = ["session_id", "timestamp", "image_result", "audio_result"]
+
+# Explicit dtypes keep each chunk compact: repeated strings become categorical codes
+READ_DTYPES = {
+    "session_id": "category",
+    "timestamp": "float32",
+    "image_result": "category",
+    "audio_result": "category",
+}
+
+
+def iter_chunks(path, chunksize=500_000, sessions=None, start=None, end=None, columns=None):
+    """Yield result chunks from a CSV, Parquet or SQLite archive, filtered by session and time range while reading.
+
+    `start`/`end` bound the session-relative timestamp in seconds (inclusive).
+    """
+    columns = list(columns or ARCHIVE_COLUMNS)
+    dtypes = {name: dtype for name, dtype in READ_DTYPES.items() if name in columns}
+    sessions = set(sessions) if sessions is not None else None
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        import pyarrow.parquet as pq
+
+        batches = (batch.to_pandas().astype(dtypes)
+                   for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns))
+    elif extension in (".sqlite", ".db"):
+        from results_sink import iter_sqlite_chunks
+
+        batches = (chunk.astype(dtypes) for chunk in iter_sqlite_chunks(path, columns, chunksize, sessions,
+                                                                         start, end))
+    else:
+        batches = pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunksize)
+
+    for chunk in batches:
+        mask = pd.Series(True, index=chunk.index)
+        if sessions is not None:
+            mask &= chunk["session_id"].isin(sessions)
+        if start is not None:
+            mask &= chunk["timestamp"] >= start
+        if end is not None:
+            mask &= chunk["timestamp"] <= end
+        if not mask.all():
+            chunk = chunk[mask]
+        if len(chunk):
+            yield chunk
+
+
+def _add(total, part):
+    """Add two count Series/DataFrames, aligning labels and treating missing ones as zero."""
+    if total is None:
+        return part.astype("int64")
+    return total.add(part, fill_value=0).fillna(0).astype("int64")
+
+
+class ArchiveAggregates:
+    """Mergeable aggregates behind the distribution, correlation, transition and statistics figures.
+
+    Feed chunks with `update` in file order. Transitions that straddle a chunk
+    boundary are counted by carrying each session's last row forward, which
+    assumes a session's rows are appended in time order (as the capture loop
+    writes them). `merge` combines aggregates built over disjoint sets of sessions.
+    """
+
+    def __init__(self):
+        self.image_counts = None
+        self.audio_counts = None
+        self.crosstab = None
+        self.image_transitions = None
+        self.audio_transitions = None
+        self.rows = 0
+        self._sessions = None
+        self._last_rows = None
+
+    def update(self, chunk):
+        # Category sets differ between chunks, so aggregate on plain string labels
+        chunk = chunk[ARCHIVE_COLUMNS].astype({"session_id": object, "image_result": object, "audio_result": object})
+        self.rows += len(chunk)
+
+        self.image_counts = _add(self.image_counts, chunk["image_result"].value_counts(sort=False))
+        self.audio_counts = _add(self.audio_counts, chunk["audio_result"].value_counts(sort=False))
+        self.crosstab = _add(self.crosstab, pd.crosstab(chunk["image_result"], chunk["audio_result"]))
+
+        stats = chunk.groupby("session_id")["timestamp"].agg(["min", "max", "count"])
+        self._merge_session_stats(stats)
+
+        # Prepend each session's last row from earlier chunks so boundary transitions are counted
+        with_carry = chunk
+        if self._last_rows is not None:
+            carried = self._last_rows[self._last_rows["session_id"].isin(with_carry["session_id"])]
+            with_carry = pd.concat([carried, with_carry], ignore_index=True)
+        self.image_transitions = _add(self.image_transitions, compute_transitions(with_carry, "image_result"))
+        self.audio_transitions = _add(self.audio_transitions, compute_transitions(with_carry, "audio_result"))
+
+        last_rows = with_carry.sort_values(["session_id", "timestamp"]).groupby("session_id").tail(1)
+        if self._last_rows is None:
+            self._last_rows = last_rows
+        else:
+            others = self._last_rows[~self._last_rows["session_id"].isin(last_rows["session_id"])]
+            self._last_rows = pd.concat([others, last_rows], ignore_index=True)
+
+    def _merge_session_stats(self, stats):
+        if self._sessions is None:
+            self._sessions = stats
+            return
+        combined = pd.concat([self._sessions, stats])
+        self._sessions = combined.groupby(level=0).agg({"min": "min", "max": "max", "count": "sum"})
+
+    def merge(self, other):
+        """Fold in aggregates computed over a disjoint set of sessions."""
+        for name in ("image_counts", "audio_counts", "crosstab", "image_transitions", "audio_transitions"):
+            theirs = getattr(other, name)
+            if theirs is not None:
+                setattr(self, name, _add(getattr(self, name), theirs))
+        self.rows += other.rows
+        if other._sessions is not None:
+            self._merge_session_stats(other._sessions)
+        if other._last_rows is not None:
+            self._last_rows = (other._last_rows if self._last_rows is None
+                               else pd.concat([self._last_rows, other._last_rows], ignore_index=True))
+        return self
+
+    @property
+    def session_stats(self):
+        """Per-session duration and sample count, shaped like visualize_session_statistics expects."""
+        if self._sessions is None:
+            return pd.DataFrame(columns=["session_id", "min_timestamp", "max_timestamp", "num_points"])
+        stats = self._sessions.rename(columns={"min": "min_timestamp", "max": "max_timestamp", "count": "num_points"})
+        return stats.rename_axis("session_id").reset_index()
+
+
+def aggregate_archive(path, chunksize=500_000, sessions=None, start=None, end=None):
+    """Stream an archive once and return its ArchiveAggregates."""
+    aggregates = ArchiveAggregates()
+    for chunk in iter_chunks(path, chunksize=chunksize, sessions=sessions, start=start, end=end):
+        aggregates.update(chunk)
+    return aggregates
+
+
+def render_archive_figures(path, output_dir=".", dpi=300, fmt="png", **filters):
+    """Draw the distribution, correlation, transition and statistics figures in bounded memory."""
+    import visualizer
+
+    aggregates = aggregate_archive(path, **filters)
+    print(f"Aggregated {aggregates.rows} data points from {len(aggregates.session_stats)} sessions")
+    if not aggregates.rows:
+        return []
+    return [
+        visualizer.plot_emotion_distribution(aggregates.image_counts, aggregates.audio_counts,
+                                             output_dir=output_dir, dpi=dpi, fmt=fmt),
+        visualizer.plot_emotion_correlation(aggregates.crosstab, output_dir=output_dir, dpi=dpi, fmt=fmt),
+        visualizer.plot_emotion_transitions(aggregates.image_transitions, aggregates.audio_transitions,
+                                            output_dir=output_dir, dpi=dpi, fmt=fmt),
+        visualizer.plot_session_statistics(aggregates.session_stats, output_dir=output_dir, dpi=dpi, fmt=fmt),
+    ]
@@ -1,17 +1,35 @@
-from huggingface_hub import InferenceClient
+import hf_client
+import metrics
+from emotion_labels import scores_to_vector
 
-with open("huggingface_token.txt", "r") as token_file:
-    api_key = token_file.read().strip()
+MODEL_ID = "firdhokk/speech-emotion-recognition-with-openai-whisper-large-v3"
 
-client = InferenceClient(
-    provider="hf-inference",
-    api_key=api_key,
-)
+def _classify_locally(audio_bytes):
+    # Circuit open or retries exhausted: run the same model through transformers
+    from audio_classification import classify_audio
+    return classify_audio(audio_bytes)
 
+def _classify(audiofile):
+    if hasattr(audiofile, "dtype"):
+        # 16 kHz mono NumPy window from audio_stream: encode it in memory
+        from audio_stream import encode_wav
+        audiofile = encode_wav(audiofile)
+    return hf_client.classify(MODEL_ID, hf_client.read_input(audiofile), fallback=_classify_locally)
+
+@metrics.timed("classify_audio")
 def classify_audio_call(audiofile):
     try:
-        output = client.audio_classification(audiofile, model="firdhokk/speech-emotion-recognition-with-openai-whisper-large-v3")
+        output = _classify(audiofile)
         return output[0]['label']
     except Exception as e:
+        print(f"Audio classification failed: {e}")
         return "failed"
 
+@metrics.timed("classify_audio")
+def classify_audio_scores(audiofile):
+    """Scores over emotion_labels.EMOTIONS as a float32 vector, or "failed"."""
+    try:
+        return scores_to_vector(_classify(audiofile))
+    except Exception as e:
+        print(f"Audio classification failed: {e}")
+        return "failed"
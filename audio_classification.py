@@ -1,19 +1,39 @@
-# Use a pipeline as a high-level helper
-from transformers import pipeline
+from inference_engine import get_engine
+from emotion_labels import scores_to_vector
 
-pipe = pipeline("audio-classification", model="firdhokk/speech-emotion-recognition-with-openai-whisper-large-v3")
+MODEL_ID = "firdhokk/speech-emotion-recognition-with-openai-whisper-large-v3"
 
-# Load model directly
-from transformers import AutoProcessor, AutoModelForAudioClassification
+# One shared pipeline per process, loaded on first use; there is no second AutoModel copy of Whisper-large-v3
+engine = get_engine("audio-classification", MODEL_ID)
 
-processor = AutoProcessor.from_pretrained("firdhokk/speech-emotion-recognition-with-openai-whisper-large-v3")
-model = AutoModelForAudioClassification.from_pretrained("firdhokk/speech-emotion-recognition-with-openai-whisper-large-v3")
+def _prepare(audiofile):
+    if hasattr(audiofile, "dtype"):
+        # Raw 16 kHz mono samples from audio_stream
+        return {"raw": audiofile, "sampling_rate": 16000}
+    return audiofile
 
 def classify_audio(audiofile):
-    emotion = pipe(audiofile, sampling_rate=16000)
+    emotion = engine.classify(_prepare(audiofile))
     print(emotion)
     return emotion
 
+def classify_audio_batch(audiofiles):
+    """Classify many clips (paths, bytes or 16 kHz arrays) in batched forward passes."""
+    return engine.classify_batch([_prepare(audiofile) for audiofile in audiofiles])
+
+def classify_audio_scores(audiofile):
+    """Full score vector over emotion_labels.EMOTIONS, micro-batched with concurrent callers."""
+    return scores_to_vector(engine.classify(_prepare(audiofile), top_k=len(engine.labels)))
+
+def classify_audio_scores_batch(audiofiles):
+    """Full score vectors over emotion_labels.EMOTIONS, one float32 array per input."""
+    results = engine.classify_batch([_prepare(audiofile) for audiofile in audiofiles], top_k=len(engine.labels))
+    return [scores_to_vector(result) for result in results]
+
+def warmup(background=False):
+    """Load the model ahead of the first classification."""
+    return engine.warmup(background=background)
+
 # from huggingface_hub import InferenceClient
 
 # client = InferenceClient(
@@ -21,4 +41,4 @@ def classify_audio(audiofile):
 #     api_key="hf_xxxxxxxxxxxxxxxxxxxxxxxx",
 # )
 
-# output = client.audio_classification("sample1.flac", model="firdhokk/speech-emotion-recognition-with-openai-whisper-large-v3")
\ No newline at end of file
+# output = client.audio_classification("sample1.flac", model="firdhokk/speech-emotion-recognition-with-openai-whisper-large-v3")
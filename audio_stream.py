@@ -0,0 +1,155 @@
+import io
+import threading
+from math import gcd
+
+import numpy as np
+from scipy.io.wavfile import write as write_wav
+from scipy.signal import resample_poly
+
+# The Whisper-based emotion model is trained on 16 kHz mono audio
+MODEL_SAMPLE_RATE = 16000
+
+
+def to_mono_float(samples):
+    """Convert int16/float frames of shape (n,) or (n, channels) to mono float32 in [-1, 1]."""
+    samples = np.asarray(samples)
+    if samples.dtype == np.int16:
+        samples = samples.astype(np.float32) / 32768.0
+    else:
+        samples = samples.astype(np.float32, copy=False)
+    if samples.ndim == 2:
+        samples = samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+    return samples
+
+
+def resample_to_model_rate(samples, sample_rate):
+    """Resample mono float32 audio to the model's 16 kHz with a polyphase filter."""
+    if sample_rate == MODEL_SAMPLE_RATE:
+        return samples
+    g = gcd(MODEL_SAMPLE_RATE, sample_rate)
+    return resample_poly(samples, MODEL_SAMPLE_RATE // g, sample_rate // g).astype(np.float32)
+
+
+def encode_wav(samples, sample_rate=MODEL_SAMPLE_RATE):
+    """Encode mono float32 audio as in-memory 16-bit PCM WAV bytes."""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    write_wav(buffer, sample_rate, pcm)
+    return buffer.getvalue()
+
+
+class AudioRingBuffer:
+    """Preallocated mono float32 ring buffer addressed by absolute sample index."""
+
+    def __init__(self, capacity, sample_rate):
+        self.capacity = int(capacity)
+        self.sample_rate = sample_rate
+        self.data = np.zeros(self.capacity, dtype=np.float32)
+        self.written = 0  # total samples written since the buffer was created
+        self._cond = threading.Condition()
+
+    def write(self, samples):
+        samples = to_mono_float(samples)
+        n = len(samples)
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+        with self._cond:
+            start = (self.written + n - len(samples)) % self.capacity
+            first = min(len(samples), self.capacity - start)
+            self.data[start:start + first] = samples[:first]
+            self.data[:len(samples) - first] = samples[first:]
+            self.written += n
+            self._cond.notify_all()
+
+    def oldest(self):
+        """Absolute index of the oldest sample still held in the buffer."""
+        return max(0, self.written - self.capacity)
+
+    def wait_for(self, end, timeout=None):
+        """Block until at least `end` samples have been written. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.written >= end, timeout)
+
+    def read(self, start, length):
+        """Copy `length` samples starting at absolute index `start`."""
+        with self._cond:
+            if start < self.oldest() or start + length > self.written:
+                raise IndexError("Requested samples are not in the ring buffer")
+            begin = start % self.capacity
+            first = min(length, self.capacity - begin)
+            out = np.empty(length, dtype=np.float32)
+            out[:first] = self.data[begin:begin + first]
+            out[first:] = self.data[:length - first]
+            return out
+
+
+class AudioStream:
+    """Continuous callback-driven microphone capture with a sliding-window extractor.
+
+    The input callback only copies into the ring buffer, so recording never
+    pauses while windows are being classified.
+    """
+
+    def __init__(self, sample_rate=44100, channels=1, window=5.0, hop=5.0, buffer_seconds=30.0, device=None):
+        if hop <= 0 or window <= 0:
+            raise ValueError("window and hop must be positive")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.window_samples = int(window * sample_rate)
+        self.hop_samples = int(hop * sample_rate)
+        self.device = device
+        capacity = max(int(buffer_seconds * sample_rate), 2 * (self.window_samples + self.hop_samples))
+        self.ring = AudioRingBuffer(capacity, sample_rate)
+        self.skipped_windows = 0
+        self._cursor = 0  # start() moves this to the live edge; a ring fed directly is read from its first sample
+        self._stream = None
+
+    def _callback(self, indata, frames, time_info, status):
+        if status:
+            print(f"Audio stream status: {status}")
+        self.ring.write(indata)
+
+    def start(self):
+        import sounddevice as sd
+
+        self._stream = sd.InputStream(samplerate=self.sample_rate, channels=self.channels,
+                                      dtype='float32', device=self.device, callback=self._callback)
+        self._stream.start()
+        self._cursor = self.ring.written
+        return self
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def next_window(self, timeout=None):
+        """Block until the next window is complete and return it as 16 kHz mono float32."""
+        end = self._cursor + self.window_samples
+        if not self.ring.wait_for(end, timeout):
+            return None
+
+        # If the consumer fell behind the buffer, jump to the newest window on the hop grid
+        if self._cursor < self.ring.oldest():
+            hops = (self.ring.written - self.window_samples - self._cursor) // self.hop_samples
+            self.skipped_windows += hops
+            self._cursor += hops * self.hop_samples
+
+        window = self.ring.read(self._cursor, self.window_samples)
+        self._cursor += self.hop_samples
+        return resample_to_model_rate(window, self.sample_rate)
+
+    def latest_window(self):
+        """Return the most recent full window without waiting, or None if not enough audio yet."""
+        written = self.ring.written
+        if written < self.window_samples:
+            return None
+        window = self.ring.read(written - self.window_samples, self.window_samples)
+        return resample_to_model_rate(window, self.sample_rate)
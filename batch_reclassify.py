@@ -0,0 +1,311 @@
+import argparse
+import csv
+import os
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from emotion_labels import normalize_label
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+AUDIO_EXTENSIONS = {".wav", ".flac", ".mp3", ".ogg"}
+OUTPUT_COLUMNS = ["session_id", "timestamp", "image_result", "audio_result"]
+
+DEFAULT_IMAGE_MODEL = "dima806/facial_emotions_image_detection"
+DEFAULT_AUDIO_MODEL = "firdhokk/speech-emotion-recognition-with-openai-whisper-large-v3"
+
+
+def discover(root):
+    """Archived captures laid out as <root>/<session_id>/<timestamp>.<ext>.
+
+    A frame and an audio clip with the same timestamp stem form one item.
+    """
+    items = {}
+    for session_id in sorted(os.listdir(root)):
+        session_dir = os.path.join(root, session_id)
+        if not os.path.isdir(session_dir):
+            continue
+        for name in os.listdir(session_dir):
+            stem, extension = os.path.splitext(name)
+            extension = extension.lower()
+            if extension in IMAGE_EXTENSIONS:
+                kind = "image"
+            elif extension in AUDIO_EXTENSIONS:
+                kind = "audio"
+            else:
+                continue
+            try:
+                timestamp = float(stem)
+            except ValueError:
+                continue
+            item = items.setdefault((session_id, timestamp),
+                                    {"session_id": session_id, "timestamp": timestamp, "image": None, "audio": None})
+            item[kind] = os.path.join(session_dir, name)
+    return [items[key] for key in sorted(items)]
+
+
+def load_manifest(path):
+    """Items from a CSV manifest with session_id, timestamp, image_path and audio_path columns.
+
+    Relative paths are resolved against the manifest's directory; either path may be empty.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    items = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            item = {"session_id": row["session_id"], "timestamp": float(row["timestamp"]), "image": None, "audio": None}
+            for kind in ("image", "audio"):
+                value = (row.get(f"{kind}_path") or "").strip()
+                if value:
+                    item[kind] = value if os.path.isabs(value) else os.path.join(base, value)
+            items.append(item)
+    return items
+
+
+def item_key(item):
+    return f"{item['session_id']}|{item['timestamp']!r}"
+
+
+class Checkpoint:
+    """Finished rows kept in SQLite; every chunk is committed atomically so a restart resumes after it.
+
+    Rows whose classification raised (API outage, open circuit breaker, a
+    model error) go to a separate `failed` table instead of `done`, so the
+    next run classifies them again rather than exporting "failed".
+    The checkpoint records the models its rows came from and refuses to resume
+    with different ones, so rescoring with a new model never reuses old labels.
+    """
+
+    def __init__(self, path, image_model=DEFAULT_IMAGE_MODEL, audio_model=DEFAULT_AUDIO_MODEL):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS done (key TEXT PRIMARY KEY, session_id TEXT, timestamp REAL, "
+            "image_result TEXT, audio_result TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS failed (key TEXT PRIMARY KEY, session_id TEXT, timestamp REAL, "
+            "error TEXT, attempts INTEGER NOT NULL DEFAULT 0)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        models = {"image_model": image_model, "audio_model": audio_model}
+        with self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO meta (name, value) VALUES (?, ?)", models.items())
+        stored = dict(self._conn.execute("SELECT name, value FROM meta"))
+        mismatched = [f"{name} {stored[name]!r} (requested {value!r})"
+                      for name, value in models.items() if stored[name] != value]
+        if mismatched:
+            self._conn.close()
+            raise ValueError(f"Checkpoint {path} was made with {', '.join(mismatched)}; "
+                             "use a new --checkpoint or --output for a different model")
+
+    def done_keys(self):
+        return {row[0] for row in self._conn.execute("SELECT key FROM done")}
+
+    def add(self, rows):
+        """Commit a chunk: successful rows become done, rows with an "error" are recorded for retry."""
+        done = [row for row in rows if not row.get("error")]
+        failed = [row for row in rows if row.get("error")]
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO done (key, session_id, timestamp, image_result, audio_result) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(row["key"], row["session_id"], row["timestamp"], row["image_result"], row["audio_result"])
+                 for row in done])
+            self._conn.executemany("DELETE FROM failed WHERE key = ?", [(row["key"],) for row in done])
+            self._conn.executemany(
+                "INSERT INTO failed (key, session_id, timestamp, error, attempts) VALUES (?, ?, ?, ?, 1) "
+                "ON CONFLICT (key) DO UPDATE SET error = excluded.error, attempts = attempts + 1",
+                [(row["key"], row["session_id"], row["timestamp"], row["error"]) for row in failed])
+        return len(done), len(failed)
+
+    def failed_count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM failed").fetchone()[0]
+
+    def rows(self):
+        cursor = self._conn.execute(
+            "SELECT session_id, timestamp, image_result, audio_result FROM done ORDER BY session_id, timestamp")
+        for row in cursor:
+            yield dict(zip(OUTPUT_COLUMNS, row))
+
+    def close(self):
+        self._conn.close()
+
+
+def _top_label(output):
+    return normalize_label(output[0]["label"]) if output else "failed"
+
+
+def _classify_local(engine, paths):
+    """(label, error) per path from one batched pass; if the batch fails, retry item by item so one bad file
+    only fails its own row."""
+    try:
+        return [(_top_label(output), None) for output in engine.classify_batch(paths)]
+    except Exception as e:
+        print(f"Batch of {len(paths)} failed ({e}); retrying one by one")
+    results = []
+    for path in paths:
+        try:
+            results.append((_top_label(engine.classify_batch([path])[0]), None))
+        except Exception as e:
+            print(f"Failed to classify {path}: {e}")
+            results.append((None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def _init_local_worker(threads):
+    # Split the cores between worker processes instead of letting each one use all of them
+    os.environ["INFERENCE_THREADS"] = str(threads)
+
+
+def classify_chunk_local(chunk, image_model, audio_model):
+    """Run one chunk through the local transformers models (loaded once per worker process)."""
+    from inference_engine import get_engine
+
+    rows = [{"key": item_key(item), "session_id": item["session_id"], "timestamp": item["timestamp"],
+             "image_result": None, "audio_result": None, "error": None} for item in chunk]
+    for kind, task, model_id in (("image", "image-classification", image_model),
+                                 ("audio", "audio-classification", audio_model)):
+        indices = [i for i, item in enumerate(chunk) if item[kind]]
+        if not indices:
+            continue
+        results = _classify_local(get_engine(task, model_id, max_batch_size=len(indices)),
+                                  [chunk[i][kind] for i in indices])
+        for i, (label, error) in zip(indices, results):
+            rows[i][f"{kind}_result"] = label
+            rows[i]["error"] = rows[i]["error"] or error
+    return rows
+
+
+def classify_chunk_api(chunk, image_model, audio_model):
+    """Run one chunk through the inference API (with the shared client's retries, breaker and cache)."""
+    import hf_client
+
+    rows = []
+    for item in chunk:
+        row = {"key": item_key(item), "session_id": item["session_id"], "timestamp": item["timestamp"],
+               "image_result": None, "audio_result": None, "error": None}
+        for kind, model_id in (("image", image_model), ("audio", audio_model)):
+            if not item[kind]:
+                continue
+            try:
+                row[f"{kind}_result"] = _top_label(hf_client.classify(model_id, hf_client.read_input(item[kind])))
+            except Exception as e:
+                # Includes CircuitOpenError while the breaker is open: retried on the next run, not saved
+                print(f"Failed to classify {item[kind]}: {e}")
+                row["error"] = row["error"] or f"{type(e).__name__}: {e}"
+        rows.append(row)
+    return rows
+
+
+def export(checkpoint, output):
+    """Write every finished row to `output`: CSV in the capture schema, or any other results_sink format.
+
+    The file is built under a temporary name and swapped in, so a rerun replaces it instead of adding to it.
+    """
+    stem, extension = os.path.splitext(output)
+    tmp_path = f"{stem}.tmp{extension}"
+    if extension.lower() in (".sqlite", ".db", ".parquet"):
+        from results_sink import open_sink
+
+        for leftover in (tmp_path, tmp_path + "-wal", tmp_path + "-shm"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        with open_sink(tmp_path, batched=False) as sink:
+            sink.write_many(list(checkpoint.rows()))
+        # A WAL left by the old database must not be replayed against the new one
+        for stale in (output + "-wal", output + "-shm"):
+            if os.path.exists(stale):
+                os.remove(stale)
+    else:
+        with open(tmp_path, "w", newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=OUTPUT_COLUMNS)
+            writer.writeheader()
+            for row in checkpoint.rows():
+                writer.writerow(dict(row, timestamp=f"{row['timestamp']:.6f}"))
+    os.replace(tmp_path, output)
+
+
+def reclassify(items, checkpoint, backend="local", image_model=DEFAULT_IMAGE_MODEL, audio_model=DEFAULT_AUDIO_MODEL,
+               workers=None, chunk_size=32):
+    """Classify every item not yet in the checkpoint, keeping at most 2 chunks per worker in flight.
+
+    Items that failed on an earlier run are not in `done`, so they are queued again here.
+    """
+    done = checkpoint.done_keys()
+    pending = [item for item in items if item_key(item) not in done]
+    retrying = checkpoint.failed_count()
+    print(f"{len(items)} items, {len(items) - len(pending)} already done, {len(pending)} to classify"
+          + (f" ({retrying} failed previously)" if retrying else ""))
+    if not pending:
+        return 0
+
+    cores = os.cpu_count() or 1
+    if backend == "local":
+        workers = workers or max(1, cores // 4)
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_local_worker,
+                                   initargs=(max(1, cores // workers),))
+        classify_chunk = classify_chunk_local
+    else:
+        # API calls are I/O bound: many threads share the one client and its connection pool
+        workers = workers or 4 * cores
+        pool = ThreadPoolExecutor(max_workers=workers)
+        classify_chunk = classify_chunk_api
+
+    chunks = iter([pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)])
+    finished = 0
+    failed = 0
+    start = time.perf_counter()
+    with pool:
+        in_flight = set()
+        while True:
+            while len(in_flight) < 2 * workers:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                in_flight.add(pool.submit(classify_chunk, chunk, image_model, audio_model))
+            if not in_flight:
+                break
+            completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                rows = future.result()
+                failed += checkpoint.add(rows)[1]
+                finished += len(rows)
+            elapsed = time.perf_counter() - start
+            print(f"{finished}/{len(pending)} items ({finished / elapsed:.1f}/s), {failed} failed")
+    if failed:
+        print(f"{failed} items failed and were not saved; run again to retry them")
+    return finished
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-classify archived frames and audio clips with a (new) model.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dir", help="archive laid out as <dir>/<session_id>/<timestamp>.<jpg|wav|...>")
+    source.add_argument("--manifest", help="CSV with session_id, timestamp, image_path, audio_path")
+    parser.add_argument("--output", default="reclassified_results.csv",
+                        help="results file: .csv (session_id,timestamp,image_result,audio_result), .sqlite or .parquet")
+    parser.add_argument("--checkpoint", default=None, help="progress database (default: <output>.checkpoint.sqlite)")
+    parser.add_argument("--backend", choices=["local", "api"], default="local")
+    parser.add_argument("--image-model", default=DEFAULT_IMAGE_MODEL)
+    parser.add_argument("--audio-model", default=DEFAULT_AUDIO_MODEL)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (local) or threads (api); default scales with the core count")
+    parser.add_argument("--chunk-size", type=int, default=32, help="items per batch and per checkpoint commit")
+    args = parser.parse_args()
+
+    items = discover(args.dir) if args.dir else load_manifest(args.manifest)
+    checkpoint = Checkpoint(args.checkpoint or args.output + ".checkpoint.sqlite",
+                            image_model=args.image_model, audio_model=args.audio_model)
+    try:
+        reclassify(items, checkpoint, backend=args.backend, image_model=args.image_model,
+                   audio_model=args.audio_model, workers=args.workers, chunk_size=args.chunk_size)
+        export(checkpoint, args.output)
+        print(f"Wrote results to {args.output}")
+        if checkpoint.failed_count():
+            print(f"{checkpoint.failed_count()} items are missing because they failed; rerun to retry them")
+    finally:
+        checkpoint.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from audio_stream import AudioStream
+from camera import encode_jpeg
+from dummy_csv_populator import generate_emotion_session_data
+from emotion_labels import scores_to_vector
+from stub_server import make_server, stub_scores
+
+IMAGE_MODEL = "dima806/facial_emotions_image_detection"
+AUDIO_MODEL = "firdhokk/speech-emotion-recognition-with-openai-whisper-large-v3"
+
+GROUPS = ("capture", "classify", "pipeline", "sink", "visualizer", "prompt")
+
+
+class SyntheticCamera:
+    """Stand-in for CameraSession: deterministic frames with a square drifting across a noisy background."""
+
+    def __init__(self, width=640, height=480, seed=0, max_width=None, jpeg_quality=90):
+        rng = np.random.default_rng(seed)
+        self.background = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        self.max_width = max_width
+        self.jpeg_quality = jpeg_quality
+        self.frames = 0
+
+    def read_frame(self, timeout=None):
+        frame = self.background.copy()
+        x = (self.frames * 8) % (frame.shape[1] - 64)
+        frame[100:164, x:x + 64] = 255
+        self.frames += 1
+        return frame
+
+    def encode(self, frame):
+        return encode_jpeg(frame, self.max_width, self.jpeg_quality)
+
+
+class SyntheticMicrophone:
+    """Feeds a real AudioStream as its input callback would, without a sound device.
+
+    Each next_window() writes one hop of 44.1 kHz stereo blocks (a tone plus
+    noise) into the stream's ring buffer and returns the stream's own window,
+    so the mono mixdown, ring buffer and 16 kHz resampling are all measured.
+    """
+
+    def __init__(self, window=5.0, sample_rate=44100, channels=2, block=1024, seed=0):
+        rng = np.random.default_rng(seed)
+        self.stream = AudioStream(sample_rate=sample_rate, channels=channels, window=window, hop=window)
+        t = np.arange(self.stream.hop_samples) / sample_rate
+        tone = 0.2 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(len(t))
+        self.hop = np.repeat(tone[:, None], channels, axis=1).astype(np.float32)
+        self.block = block
+        self.resampled = self.next_window()  # also fills the first window
+
+    def next_window(self, timeout=None):
+        while self.stream.ring.written < self.stream._cursor + self.stream.window_samples:
+            for i in range(0, len(self.hop), self.block):
+                self.stream.ring.write(self.hop[i:i + self.block])
+        return self.stream.next_window(timeout)
+
+
+class StubClassifier:
+    """Deterministic classifier with a fixed latency, scoring inputs the same way stub_server does."""
+
+    def __init__(self, model_id, latency=0.0):
+        self.model_id = model_id
+        self.latency = latency
+
+    def __call__(self, payload):
+        if self.latency:
+            time.sleep(self.latency)
+        body = payload if isinstance(payload, (bytes, bytearray)) else np.asarray(payload).tobytes()
+        return scores_to_vector(stub_scores(self.model_id, bytes(body[:4096])))
+
+
+class StubInferenceServer:
+    """stub_server on a free local port, with hf_client pointed at it and its result cache off.
+
+    The real classification path (hf_client, its retries and breaker, WAV and
+    score conversion) then runs against a local endpoint with a fixed latency.
+    """
+
+    def __init__(self, latency=0.0):
+        self.server = make_server(port=0, latency=latency)
+        threading.Thread(target=self.server.serve_forever, name="stub-inference", daemon=True).start()
+        # Read by hf_client when it creates its shared client, so set before the first call
+        os.environ["HF_INFERENCE_URL"] = f"http://127.0.0.1:{self.server.server_address[1]}/models"
+        os.environ["INFERENCE_CACHE"] = "0"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def checked(classify):
+    """The api_call classifiers return "failed" instead of raising; a benchmark of failures is useless."""
+    def call(payload):
+        result = classify(payload)
+        if isinstance(result, str) and result == "failed":
+            raise RuntimeError(f"{classify.__name__} failed against the stub server")
+        return result
+    return call
+
+
+def time_calls(fn, calls):
+    """Mean seconds per call over `calls` calls."""
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+
+def bench_capture(options):
+    """Frame and JPEG timings plus the AudioStream window path; `*_stub_baseline` is a plain array copy."""
+    camera = SyntheticCamera(seed=options.seed, max_width=options.max_width)
+    microphone = SyntheticMicrophone(seed=options.seed)
+    resampled = microphone.resampled
+    return {
+        "capture.frame": time_calls(camera.read_frame, options.calls),
+        "capture.encode_jpeg": time_calls(lambda: camera.encode(camera.read_frame()), options.calls),
+        "capture.audio_window": time_calls(microphone.next_window, options.calls),
+        "capture.audio_window_stub_baseline": time_calls(resampled.copy, options.calls),
+    }
+
+
+def bench_classify(options):
+    """The api_call classifiers through hf_client and the stub server; `*_stub_baseline` skips HTTP entirely."""
+    from audio_api_call import classify_audio_scores
+    from image_api_call import classify_image_scores
+
+    camera = SyntheticCamera(seed=options.seed, max_width=options.max_width)
+    microphone = SyntheticMicrophone(seed=options.seed)
+    jpeg = camera.encode(camera.read_frame())
+    window = microphone.next_window()
+    classify_image = checked(classify_image_scores)
+    classify_audio = checked(classify_audio_scores)
+    stub_image = StubClassifier(IMAGE_MODEL, options.latency)
+    stub_audio = StubClassifier(AUDIO_MODEL, options.latency)
+    return {
+        "classify.image": time_calls(lambda: classify_image(jpeg), options.calls),
+        "classify.audio": time_calls(lambda: classify_audio(window), options.calls),
+        "classify.image_stub_baseline": time_calls(lambda: stub_image(jpeg), options.calls),
+        "classify.audio_stub_baseline": time_calls(lambda: stub_audio(window), options.calls),
+    }
+
+
+def bench_pipeline(options):
+    """Run the real CapturePipeline and api_call classifiers against the stub server until `ticks` rows are written."""
+    from audio_api_call import classify_audio_scores
+    from image_api_call import classify_image_scores
+    from pipeline import CapturePipeline, BLOCK
+
+    camera = SyntheticCamera(seed=options.seed, max_width=options.max_width)
+    microphone = SyntheticMicrophone(seed=options.seed)
+    classify_image = checked(classify_image_scores)
+    written = []
+    done = threading.Event()
+
+    def write_row(timestamp, image_result, audio_result, image_reused, audio_reused):
+        written.append(timestamp)
+        if len(written) >= options.ticks:
+            done.set()
+
+    pipeline = CapturePipeline(
+        capture_image=camera.read_frame,
+        capture_audio=microphone.next_window,
+        classify_image=lambda frame: classify_image(camera.encode(frame)),
+        classify_audio=checked(classify_audio_scores),
+        write_row=write_row,
+        workers=options.workers,
+        drop_policy=BLOCK,
+    )
+    start = time.perf_counter()
+    pipeline.start()
+    finished = done.wait(options.pipeline_timeout)
+    elapsed = time.perf_counter() - start
+    pipeline.stop()
+    if not finished:
+        raise RuntimeError(f"Pipeline wrote {len(written)} of {options.ticks} rows "
+                           f"within {options.pipeline_timeout:.0f}s")
+
+    results = {"pipeline.tick": elapsed / len(written)}
+    for name, stats in pipeline.stats.items():
+        results[f"pipeline.{name}"] = stats.snapshot()["mean"]
+    return results
+
+
+def bench_sink(options, rows, output_dir):
+    """Write every row through each sink in batches of 50, as BatchedSink does."""
+    from results_sink import CsvSink, SQLiteSink
+
+    results = {}
+    for name, sink_class, extension in (("csv", CsvSink, ".csv"), ("sqlite", SQLiteSink, ".sqlite")):
+        path = os.path.join(output_dir, f"bench_results{extension}")
+        if os.path.exists(path):
+            os.remove(path)
+        sink = sink_class(path)
+        start = time.perf_counter()
+        for i in range(0, len(rows), 50):
+            sink.write_many(rows[i:i + 50])
+            sink.flush()
+        sink.close()
+        results[f"sink.{name}_row"] = (time.perf_counter() - start) / len(rows)
+    return results
+
+
+def bench_visualizer(options, csv_path, output_dir):
+    import visualizer
+
+    visualizer.use_agg_backend()
+    settings = {"output_dir": output_dir, "dpi": 72, "fmt": "png"}
+    results = {}
+    start = time.perf_counter()
+    df = visualizer.load_data(csv_path)
+    results["visualizer.load_data"] = time.perf_counter() - start
+    for name in ("visualize_emotion_distribution", "visualize_emotion_correlation",
+                 "visualize_emotion_transitions", "visualize_session_statistics"):
+        start = time.perf_counter()
+        getattr(visualizer, name)(df, **settings)
+        results[f"visualizer.{name}"] = time.perf_counter() - start
+    start = time.perf_counter()
+    visualizer.visualize_session_timeline(df, num_sessions=3, workers=1, **settings)
+    results["visualizer.visualize_session_timeline"] = time.perf_counter() - start
+    return results
+
+
+def bench_prompt(options, csv_path):
+    from prompt_builder import build_prompt
+    from results_sink import read_results
+
+    df = read_results(csv_path, columns=["session_id", "timestamp", "image_result", "audio_result"])
+    start = time.perf_counter()
+    build_prompt(df)
+    return {"prompt.build_prompt": time.perf_counter() - start}
+
+
+def run_groups(options, groups, rows, csv_path, output_dir):
+    results = {}
+    if "capture" in groups:
+        results.update(bench_capture(options))
+    if "classify" in groups:
+        results.update(bench_classify(options))
+    if "pipeline" in groups:
+        results.update(bench_pipeline(options))
+    if "sink" in groups:
+        results.update(bench_sink(options, rows, output_dir))
+    if "visualizer" in groups:
+        results.update(bench_visualizer(options, csv_path, output_dir))
+    if "prompt" in groups:
+        results.update(bench_prompt(options, csv_path))
+    return results
+
+
+def run_benchmarks(options):
+    """Run the selected groups `repeat` times; each metric is seconds (per call or per run), lower is better."""
+    groups = options.only or GROUPS
+    runs = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        rows = generate_emotion_session_data(options.rows, num_sessions=options.sessions, seed=options.seed)
+        csv_path = os.path.join(output_dir, "bench_input.csv")
+        pd.DataFrame(rows).to_csv(csv_path, index=False, float_format="%.6f")
+        server = StubInferenceServer(options.latency) if {"classify", "pipeline"} & set(groups) else None
+        try:
+            for _ in range(options.repeat):
+                results = run_groups(options, groups, rows, csv_path, output_dir)
+                for name, seconds in results.items():
+                    runs.setdefault(name, []).append(seconds)
+        finally:
+            if server is not None:
+                server.close()
+
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": vars(options),
+        },
+        "results": {name: {"seconds": statistics.median(values), "min": min(values), "runs": values}
+                    for name, values in runs.items()},
+    }
+
+
+def compare(current, baseline, tolerance=0.25):
+    """Print current vs baseline medians and return the names that got more than `tolerance` slower."""
+    regressions = []
+    print(f"{'metric':<45} {'baseline':>11} {'current':>11} {'change':>8}")
+    for name, result in current["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None or not previous["seconds"]:
+            print(f"{name:<45} {'-':>11} {result['seconds']:>10.5f}s {'new':>8}")
+            continue
+        change = result["seconds"] / previous["seconds"] - 1
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<45} {previous['seconds']:>10.5f}s {result['seconds']:>10.5f}s {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the capture, classification, sink, report and prompt paths.")
+    parser.add_argument("--rows", type=int, default=20000, help="synthetic result rows for sink/report/prompt")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--calls", type=int, default=50, help="calls per capture/classify measurement")
+    parser.add_argument("--ticks", type=int, default=100, help="rows the pipeline benchmark writes")
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="stub server and stub classifier latency in seconds")
+    parser.add_argument("--pipeline-timeout", type=float, default=120.0,
+                        help="seconds the pipeline benchmark may take before it is reported as stuck")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-width", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", choices=GROUPS, help="run only these groups")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline, as a fraction")
+    options = parser.parse_args()
+
+    current = run_benchmarks(options)
+    with open(options.output, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"Wrote {len(current['results'])} metrics to {options.output}")
+
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, options.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed by more than {options.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        for name, result in current["results"].items():
+            print(f"{name:<45} {result['seconds']:.5f}s")
+
+
+if __name__ == "__main__":
+    main()
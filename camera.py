@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+def encode_jpeg(frame, max_width=None, quality=90):
+    """Downscale a BGR frame to at most max_width pixels wide and JPEG-encode it in memory."""
+    if max_width and frame.shape[1] > max_width:
+        scale = max_width / frame.shape[1]
+        size = (max_width, max(1, int(round(frame.shape[0] * scale))))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    ok, buffer = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+    if not ok:
+        return None
+    return buffer.tobytes()
+
+
+class CameraSession:
+    """Long-lived camera handle that keeps only the most recent frames in memory.
+
+    A background thread reads the device continuously, so callers always get a
+    fresh frame without paying the open/warm-up cost on every sample. If the
+    camera cannot be opened the session stays usable without it: `available`
+    is False and every read returns None, so capture carries on audio-only.
+    """
+
+    def __init__(self, source=0, buffer_size=1, max_width=None, jpeg_quality=90, warmup=0.5):
+        self.source = source
+        self.max_width = max_width
+        self.jpeg_quality = jpeg_quality
+        self.warmup = warmup
+        self._frames = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._new_frame = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread = None
+        self._cap = None
+        self.available = False
+
+    def open(self):
+        if self._cap is not None:
+            return self
+        self._cap = cv2.VideoCapture(self.source)
+        if not self._cap.isOpened():
+            self._cap = None
+            self.available = False
+            print(f"Warning: could not open camera {self.source!r}; continuing without video")
+            return self
+        self.available = True
+
+        # Give the camera a moment to adjust once, not on every frame
+        time.sleep(self.warmup)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._reader, name="camera-reader", daemon=True)
+        self._thread.start()
+        return self
+
+    def _reader(self):
+        while not self._stop.is_set():
+            ret, frame = self._cap.read()
+            if not ret:
+                # Let a file source end gracefully, retry briefly for live devices
+                if isinstance(self.source, str):
+                    break
+                time.sleep(0.01)
+                continue
+            with self._new_frame:
+                self._frames.append((time.monotonic(), frame))
+                self._new_frame.notify_all()
+
+    def latest(self, timeout=1.0):
+        """Return (capture_time, frame) for the newest frame, or None if none arrived in time."""
+        if not self.available:
+            return None
+        with self._new_frame:
+            if not self._frames:
+                self._new_frame.wait(timeout)
+            if not self._frames:
+                return None
+            return self._frames[-1]
+
+    def read_frame(self, timeout=1.0):
+        """Return the newest BGR frame as a NumPy array, or None."""
+        item = self.latest(timeout)
+        return None if item is None else item[1]
+
+    def encode(self, frame):
+        """Encode a frame to JPEG bytes using the session's size/quality settings."""
+        return encode_jpeg(frame, self.max_width, self.jpeg_quality)
+
+    def read_jpeg(self, timeout=1.0):
+        """Encode the newest frame to JPEG bytes."""
+        frame = self.read_frame(timeout)
+        return None if frame is None else self.encode(frame)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        self.available = False
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,78 @@
+import threading
+
+import cv2
+import numpy as np
+
+
+class FrameGate:
+    """Skip frames that barely differ from the last frame that was actually classified.
+
+    Frames are reduced to a small grayscale thumbnail and compared by mean
+    absolute difference (0-255 scale). The reference only moves when a frame
+    passes, so slow drift still accumulates until it crosses the threshold.
+    """
+
+    def __init__(self, threshold=6.0, size=32, max_reuse=30):
+        self.threshold = threshold
+        self.size = size
+        self.max_reuse = max_reuse
+        self.passed = 0
+        self.reused = 0
+        self._reference = None
+        self._consecutive = 0
+        self._lock = threading.Lock()
+
+    def signature(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, (self.size, self.size), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def should_classify(self, frame):
+        signature = self.signature(frame)
+        with self._lock:
+            changed = (self._reference is None
+                       or float(np.abs(signature - self._reference).mean()) > self.threshold
+                       or (self.max_reuse is not None and self._consecutive >= self.max_reuse))
+            if changed:
+                self._reference = signature
+                self._consecutive = 0
+                self.passed += 1
+            else:
+                self._consecutive += 1
+                self.reused += 1
+            return changed
+
+
+class AudioGate:
+    """Energy-based voice activity gate: skip windows whose RMS level is below the threshold."""
+
+    def __init__(self, rms_threshold=0.01):
+        self.rms_threshold = rms_threshold
+        self.passed = 0
+        self.skipped = 0
+
+    def should_classify(self, samples):
+        rms = float(np.sqrt(np.mean(np.square(samples, dtype=np.float64)))) if len(samples) else 0.0
+        if rms >= self.rms_threshold:
+            self.passed += 1
+            return True
+        self.skipped += 1
+        return False
+
+
+class LastLabels:
+    """Most recent label per modality, shared between capture and classifier threads."""
+
+    def __init__(self):
+        self._labels = {}
+        self._lock = threading.Lock()
+
+    def get(self, modality):
+        with self._lock:
+            return self._labels.get(modality)
+
+    def set(self, modality, label):
+        # Labels may also be score vectors; only a real result replaces the last one
+        if label is None or isinstance(label, str) and label == "failed":
+            return
+        with self._lock:
+            self._labels[modality] = label
@@ -1,16 +1,23 @@
 import cv2
-import numpy as np
 from PIL import Image
-import os
 import time
-from image_api_call import classify_image_call
-from audio_api_call import classify_audio_call
+from image_api_call import classify_image_call, classify_image_scores
+from audio_api_call import classify_audio_scores
 import sounddevice as sd
 from scipy.io.wavfile import write
-import csv
 import uuid
+import argparse
 from datetime import datetime
+from pipeline import CapturePipeline, DROP_POLICIES, DROP_OLDEST
+from camera import CameraSession
+from audio_stream import AudioStream
+from change_gate import FrameGate, AudioGate
+from results_sink import open_sink
+from emotion_labels import as_label, as_scores
+from fusion import FusionState
+import metrics
 
+@metrics.timed("capture_video_frame")
 def capture_video_frame(output_file="captured_frame.jpg"):
     """Capture a single frame from the webcam and save it as a JPG file."""
     print("Capturing video frame...")
@@ -42,14 +49,34 @@ def capture_video_frame(output_file="captured_frame.jpg"):
     print("Failed to capture video frame")
     return None
 
-def classify_image(image_file):
-    print(f"Classifying image: {image_file}")
-    # Example of how you might implement this with your API
-    with open(image_file, 'rb') as f:
+@metrics.timed("capture_image")
+def capture_frame(camera):
+    """Grab the newest frame from an open camera session."""
+    frame = camera.read_frame()
+    if frame is None:
+        print("Failed to capture video frame")
+    return frame
+
+@metrics.timed("encode_jpeg")
+def encode_frame(camera, frame):
+    """JPEG-encode a frame with the camera session's size/quality settings."""
+    return camera.encode(frame)
+
+@metrics.timed("capture_audio")
+def capture_audio_window(microphone):
+    """Wait for the next audio window from the open microphone stream."""
+    return microphone.next_window()
+
+def classify_image(image):
+    """Classify a JPEG given either as in-memory bytes or as a file path."""
+    if isinstance(image, (bytes, bytearray)):
+        return classify_image_call(image)
+    print(f"Classifying image: {image}")
+    with open(image, 'rb') as f:
         image_data = f.read()
         return classify_image_call(image_data)
-    #return "Image classification result would appear here"
 
+@metrics.timed("capture_audio_file")
 def capture_audio():
     print("Capturing audio...")
     duration = 5  # seconds
@@ -64,37 +91,179 @@ def capture_audio():
     print(f"Audio captured and saved to {audio_file}")
     return audio_file
 
-def main():    
-    # Initialize CSV file
-    csv_file = "classification_results.csv"
-    if not os.path.exists(csv_file):
-        with open(csv_file, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(["session_id", "timestamp", "image_result", "audio_result"])
+def result_row(session_id, timestamp, image_result, audio_result, image_reused=False, audio_reused=False,
+               fused_result=None, image_scores=None, audio_scores=None):
+    return {
+        "session_id": session_id,
+        "timestamp": timestamp,
+        "image_result": image_result,
+        "audio_result": audio_result,
+        "image_reused": int(image_reused),
+        "audio_reused": int(audio_reused),
+        "fused_result": fused_result,
+        "image_scores": image_scores,
+        "audio_scores": audio_scores,
+    }
+
+def run_pipelined(sink, session_id, camera, microphone, frame_gate=None, audio_gate=None,
+                  interval=None, queue_size=4, workers=2, drop_policy=DROP_OLDEST, report_every=30, tick_log=None):
+    """Capture and classify concurrently until interrupted."""
+    fusion = FusionState()
+
+    # Classifiers return score vectors; write_row runs under the pipeline's write lock, one row at a time
+    def write_row(timestamp, image_scores, audio_scores, image_reused, audio_reused):
+        fused_result = fusion.update(as_scores(image_scores), as_scores(audio_scores))
+        image_result, audio_result = as_label(image_scores), as_label(audio_scores)
+        print(f"\n[{timestamp:.1f}s] Image: {image_result} | Audio: {audio_result} | Fused: {fused_result}")
+        sink.write(result_row(session_id, timestamp, image_result, audio_result, image_reused, audio_reused,
+                              fused_result, as_scores(image_scores), as_scores(audio_scores)))
+        metrics.record_row()
+        if tick_log:
+            tick_log.write(timestamp, queued=pipeline.ticks.qsize(), dropped=pipeline.dropped)
 
+    pipeline = CapturePipeline(
+        capture_image=lambda: capture_frame(camera),
+        capture_audio=lambda: capture_audio_window(microphone),
+        classify_image=lambda frame: classify_image_scores(encode_frame(camera, frame)),
+        classify_audio=classify_audio_scores,
+        write_row=write_row,
+        interval=interval,
+        queue_size=queue_size,
+        workers=workers,
+        drop_policy=drop_policy,
+        image_gate=frame_gate,
+        audio_gate=audio_gate,
+    )
+    metrics.QUEUE_DEPTH.set_function(pipeline.ticks.qsize)
+    metrics.TICKS_DROPPED.set_function(lambda: pipeline.dropped)
+    pipeline.start()
+    try:
+        while True:
+            time.sleep(report_every)
+            pipeline.report()
+    except KeyboardInterrupt:
+        print("Stopping pipeline...")
+    finally:
+        pipeline.stop()
+        pipeline.report()
+
+def main(pipelined=False, interval=None, queue_size=4, workers=2, drop_policy=DROP_OLDEST,
+         camera_index=0, max_width=None, jpeg_quality=90, audio_window=5.0, audio_hop=5.0,
+         frame_threshold=6.0, silence_threshold=0.01, results_path="classification_results.csv",
+         flush_rows=50, flush_interval=5.0, fsync=False, metrics_port=None, tick_log_path=None,
+         summary_path=None):
     session_id = str(uuid.uuid4())  # Generate a unique session ID
+
+    # Optional: stage latencies, failures, queue depth and samples/min at http://127.0.0.1:<metrics_port>/metrics
+    metrics_server = metrics.serve_metrics(metrics_port) if metrics_port else None
+    tick_log = metrics.TickLog(tick_log_path) if tick_log_path else None
+
+    # Keep the camera and microphone open for the whole session instead of reopening them per sample
+    camera = CameraSession(camera_index, max_width=max_width, jpeg_quality=jpeg_quality)
+    microphone = AudioStream(window=audio_window, hop=audio_hop)
+    # A threshold of 0 disables the corresponding gate
+    frame_gate = FrameGate(frame_threshold) if frame_threshold > 0 else None
+    audio_gate = AudioGate(silence_threshold) if silence_threshold > 0 else None
+    # Rows are buffered and written by a background thread every flush_rows rows or flush_interval seconds
+    # and, with a summary path, also folded into the per-session summary index the reports read
+    sink = open_sink(results_path, max_rows=flush_rows, max_interval=flush_interval, fsync=fsync,
+                     summary_path=summary_path)
+    try:
+        with sink, camera, microphone:
+            if pipelined:
+                run_pipelined(sink, session_id, camera, microphone, frame_gate, audio_gate,
+                              interval=interval, queue_size=queue_size, workers=workers,
+                              drop_policy=drop_policy, tick_log=tick_log)
+            else:
+                run_serial(sink, session_id, camera, microphone, frame_gate, audio_gate, tick_log=tick_log)
+    finally:
+        if tick_log:
+            tick_log.close()
+        if metrics_server:
+            metrics_server.shutdown()
+
+def run_serial(sink, session_id, camera, microphone, frame_gate=None, audio_gate=None, tick_log=None):
+    """Capture and classify one tick at a time until interrupted."""
     start_time = datetime.now()
+    fusion = FusionState()
+
+    # Scores of the last classified frame and window, carried into ticks the gates mark as reused
+    last_image_scores = None
+    last_audio_scores = None
 
     while True:
         # Capture video frame
-        image_file = capture_video_frame()
-        audio_file = capture_audio()
+        frame = capture_frame(camera)
+        audio_window = capture_audio_window(microphone)
         timestamp = (datetime.now() - start_time).total_seconds()  # Calculate timestamp
 
-        image_result = None
-        audio_result = None
+        # Unchanged frames and silent windows keep the previous label
+        image_reused = frame is not None and frame_gate is not None and not frame_gate.should_classify(frame)
+        audio_reused = (audio_window is not None and audio_gate is not None
+                        and not audio_gate.should_classify(audio_window))
 
-        if image_file:
-            image_result = classify_image(image_file)
-            print(f"\nImage Classification Result: {image_result}")
-        if audio_file:
-            audio_result = classify_audio_call(audio_file)
-            print(f"\nAudio Classification Result: {audio_result}")
+        # A tick without a frame or audio window gets no result for it
+        image_scores = None
+        audio_scores = None
+        if image_reused:
+            image_scores = last_image_scores
+        elif frame is not None:
+            image_scores = last_image_scores = classify_image_scores(encode_frame(camera, frame))
+            print(f"\nImage Classification Result: {as_label(image_scores)}")
+        if audio_reused:
+            audio_scores = last_audio_scores
+        elif audio_window is not None:
+            audio_scores = last_audio_scores = classify_audio_scores(audio_window)
+            print(f"\nAudio Classification Result: {as_label(audio_scores)}")
+        fused_result = fusion.update(as_scores(image_scores), as_scores(audio_scores))
 
-        # Store results in CSV
-        with open(csv_file, mode='a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow([session_id, timestamp, image_result, audio_result])
+        # Store results
+        sink.write(result_row(session_id, timestamp, as_label(image_scores), as_label(audio_scores),
+                              image_reused, audio_reused, fused_result,
+                              as_scores(image_scores), as_scores(audio_scores)))
+        metrics.record_row()
+        if tick_log:
+            tick_log.write(timestamp)
         
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Capture and classify webcam and microphone emotions.")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="overlap capture with classification using a worker pool")
+    parser.add_argument("--interval", type=float, default=None,
+                        help="fixed capture cadence in seconds (pipelined mode)")
+    parser.add_argument("--queue-size", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--drop-policy", choices=DROP_POLICIES, default=DROP_OLDEST)
+    parser.add_argument("--camera", type=int, default=0, help="camera device index")
+    parser.add_argument("--max-width", type=int, default=None,
+                        help="downscale frames to this width before JPEG encoding")
+    parser.add_argument("--jpeg-quality", type=int, default=90)
+    parser.add_argument("--audio-window", type=float, default=5.0,
+                        help="length of each audio window in seconds")
+    parser.add_argument("--audio-hop", type=float, default=5.0,
+                        help="seconds between the starts of consecutive audio windows")
+    parser.add_argument("--frame-threshold", type=float, default=6.0,
+                        help="mean thumbnail difference (0-255) below which a frame reuses the last label; 0 disables")
+    parser.add_argument("--silence-threshold", type=float, default=0.01,
+                        help="RMS level below which an audio window is skipped as silent; 0 disables")
+    parser.add_argument("--results", default="classification_results.csv",
+                        help="results file: .csv, .sqlite/.db or .parquet")
+    parser.add_argument("--flush-rows", type=int, default=50)
+    parser.add_argument("--flush-interval", type=float, default=5.0)
+    parser.add_argument("--fsync", action="store_true", help="fsync the results file on every flush")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics at http://127.0.0.1:<port>/metrics (e.g. 9108)")
+    parser.add_argument("--tick-log", default=None,
+                        help="append one JSON line of stage timings per written row to this file")
+    parser.add_argument("--summary", default=None,
+                        help="also keep this per-session summary database (e.g. session_summary.sqlite) "
+                             "up to date with every batch")
+    args = parser.parse_args()
+    main(pipelined=args.pipelined, interval=args.interval, queue_size=args.queue_size,
+         workers=args.workers, drop_policy=args.drop_policy, camera_index=args.camera,
+         max_width=args.max_width, jpeg_quality=args.jpeg_quality,
+         audio_window=args.audio_window, audio_hop=args.audio_hop,
+         frame_threshold=args.frame_threshold, silence_threshold=args.silence_threshold,
+         results_path=args.results, flush_rows=args.flush_rows, flush_interval=args.flush_interval,
+         fsync=args.fsync, metrics_port=args.metrics_port, tick_log_path=args.tick_log,
+         summary_path=args.summary)
\ No newline at end of file
@@ -1,10 +1,17 @@
 import pyaudio
-import wave
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import cv2
+import numpy as np
+import pandas as pd
 import streamlit as st
+from audio_stream import AudioRingBuffer, resample_to_model_rate, MODEL_SAMPLE_RATE
+import audio_classification
+import image_classification
 from audio_classification import classify_audio
-from image_classification import classify_image  # Assume this is your video classification module
+from video_classification import classify_clip
 
 # Audio recording settings
 FORMAT = pyaudio.paInt16
@@ -12,81 +19,150 @@ CHANNELS = 1
 RATE = 44100
 CHUNK = 1024
 RECORD_SECONDS = 7
-AUDIO_OUTPUT_FILENAME = "recorded_audio.wav"
 VIDEO_OUTPUT_FILENAME = "recorded_video.avi"
+VIDEO_FPS = 20.0
+# The live preview only needs to show the child is in frame; sending every frame stalls the capture loop
+PREVIEW_FPS = 4
+KEYFRAME_FPS = 2.0
+# Time for the camera and microphone to open before the shared recording window begins
+DEVICE_LEAD_IN = 0.5
 
-def record_audio():
-    audio = pyaudio.PyAudio()
+# Shared clock for audio chunk and video frame timestamps
+clock = time.monotonic
+
+def record_audio(start, end):
+    """Record audio between `start` and `end` on the shared clock.
 
-    # Open the audio stream
+    Returns 16 kHz mono float32 samples and the capture time of each chunk, in seconds after `start`.
+    """
+    audio = pyaudio.PyAudio()
+    ring = AudioRingBuffer(int(RATE * (end - start)) + CHUNK, RATE)
+    chunk_times = []
+    done = threading.Event()
+
+    def callback(in_data, frame_count, time_info, status):
+        # Stamp the chunk on arrival: its first sample was captured frame_count samples earlier
+        arrived = clock()
+        first = arrived - frame_count / RATE
+        samples = np.frombuffer(in_data, dtype=np.int16)
+        if first < start:
+            samples = samples[min(len(samples), int((start - first) * RATE)):]
+            first = start
+        if arrived >= end:
+            samples = samples[:max(0, int((end - first) * RATE))]
+        if len(samples):
+            chunk_times.append(first - start)
+            ring.write(samples)
+        if arrived >= end:
+            done.set()
+            return (None, pyaudio.paComplete)
+        return (None, pyaudio.paContinue)
+
+    # Open the audio stream; PyAudio fills the preallocated ring buffer from its own thread
     stream = audio.open(format=FORMAT, channels=CHANNELS,
                         rate=RATE, input=True,
-                        frames_per_buffer=CHUNK)
-
-    st.write("Recording audio...")
-
-    frames = []
+                        frames_per_buffer=CHUNK,
+                        stream_callback=callback)
 
-    # Record for the specified duration
-    for _ in range(0, int(RATE / CHUNK * RECORD_SECONDS)):
-        data = stream.read(CHUNK)
-        frames.append(data)
-
-    st.write("Audio recording complete.")
+    # Record until the shared end time
+    done.wait(end - clock() + 2.0)
 
     # Stop and close the stream
     stream.stop_stream()
     stream.close()
     audio.terminate()
 
-    # Save the recorded audio to a file
-    with wave.open(AUDIO_OUTPUT_FILENAME, 'wb') as wf:
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(audio.get_sample_size(FORMAT))
-        wf.setframerate(RATE)
-        wf.writeframes(b''.join(frames))
+    samples = ring.read(ring.oldest(), min(ring.written, ring.capacity))
+    return resample_to_model_rate(samples, RATE), chunk_times
 
-    return AUDIO_OUTPUT_FILENAME
+def record_video(start, end, latest_frame):
+    """Record webcam frames between `start` and `end` on the shared clock.
 
-def record_video():
-    st.write("Recording video...")
+    The newest frame is left in `latest_frame` for the preview. Returns the
+    video path and each written frame's capture time in seconds after `start`;
+    the path is None when the camera gave no frames, so an older recording is
+    never classified in its place.
+    """
     cap = cv2.VideoCapture(0)  # Open the webcam
     fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(VIDEO_OUTPUT_FILENAME, fourcc, 20.0, (640, 480))
+    out = None
+    frame_times = []
 
-    start_time = time.time()
-    while int(time.time() - start_time) < RECORD_SECONDS:
+    while True:
         ret, frame = cap.read()
-        if ret:
-            out.write(frame)
-            # Display the video frame in Streamlit
-            st.image(frame, channels="BGR")
-        else:
+        now = clock()
+        if not ret or now >= end:
             break
+        if now < start:
+            continue
+        if out is None:
+            # Size the writer from the camera; mismatched sizes are silently dropped by OpenCV
+            height, width = frame.shape[:2]
+            out = cv2.VideoWriter(VIDEO_OUTPUT_FILENAME, fourcc, VIDEO_FPS, (width, height))
+        out.write(frame)
+        frame_times.append(now - start)
+        latest_frame.append(frame)
 
     cap.release()
+    if out is None:
+        return None, frame_times
     out.release()
-    st.write("Video recording complete.")
 
-    return VIDEO_OUTPUT_FILENAME
+    return VIDEO_OUTPUT_FILENAME, frame_times
 
 def main():
     st.title("Audio and Video Emotion Classification")
 
-    if st.button("Start Recording"):
-        # Record audio
-        audio_file = record_audio()
-
-        # Record video
-        video_file = record_video()
+    # Load both models in the background while the page renders and the user records
+    audio_classification.warmup(background=True)
+    image_classification.warmup(background=True)
 
-        # Perform emotion classification on the recorded audio
-        audio_emotion = classify_audio(audio_file)
+    if st.button("Start Recording"):
+        st.write("Recording audio and video...")
+        # Both devices open during the lead-in, then keep only what falls in the same window
+        start = clock() + DEVICE_LEAD_IN
+        end = start + RECORD_SECONDS
+        latest_frame = deque(maxlen=1)
+        preview = st.empty()
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            audio_future = pool.submit(record_audio, start, end)
+            video_future = pool.submit(record_video, start, end, latest_frame)
+
+            # Streamlit calls stay on this thread; show the newest frame at a low rate
+            while not (audio_future.done() and video_future.done()):
+                if latest_frame:
+                    preview.image(latest_frame[-1], channels="BGR")
+                time.sleep(1.0 / PREVIEW_FPS)
+
+            audio_samples, chunk_times = audio_future.result()
+            video_file, frame_times = video_future.result()
+            st.write("Recording complete.")
+            if chunk_times and frame_times:
+                st.caption(f"Audio {chunk_times[0]:.2f}-{chunk_times[0] + len(audio_samples) / MODEL_SAMPLE_RATE:.2f}s, "
+                           f"video {frame_times[0]:.2f}-{frame_times[-1]:.2f}s ({len(frame_times)} frames)")
+
+            # Classify both modalities at the same time
+            audio_future = pool.submit(classify_audio, audio_samples)
+            video_future = None
+            if video_file is not None:
+                video_future = pool.submit(classify_clip, video_file, sample_fps=KEYFRAME_FPS,
+                                           frame_times=frame_times)
+            audio_emotion = audio_future.result()
+            video_result = video_future.result() if video_future is not None else None
+
+        # Emotion classification of the recorded audio
         st.write(f"Audio Emotion: {audio_emotion}")
 
-        # Perform emotion classification on the recorded video
-        video_emotion = classify_image(video_file)
-        st.write(f"Video Emotion: {video_emotion}")
+        # Emotion classification of keyframes sampled from the recorded video
+        if video_result is None:
+            st.warning("No video frames were recorded (camera unavailable?); video classification skipped.")
+            return
+        st.write(f"Video Emotion: {video_result['label']}")
+        if video_result["timeline"]:
+            st.bar_chart(pd.Series(video_result["distribution"], name="probability"))
+            st.line_chart(pd.DataFrame(video_result["probabilities"], index=video_result["times"],
+                                       columns=video_result["labels"]))
 
 if __name__ == "__main__":
     main()
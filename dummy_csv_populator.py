@@ -1,3 +1,4 @@
+import argparse
 import csv
 import uuid
 import random
@@ -7,35 +8,44 @@ from datetime import datetime, timedelta
 image_emotions = ["happy", "sad", "angry", "surprise", "fear", "disgust", "neutral"]
 audio_emotions = ["happy", "sad", "angry", "fearful", "surprised", "neutral", "calm"]
 
-# Generate 1000 rows of data across multiple sessions
-def generate_emotion_session_data(num_rows=1000):
+# Generate rows of data across multiple sessions
+def generate_emotion_session_data(num_rows=1000, num_sessions=None, seed=None):
+    """Synthetic result rows. With `num_sessions`, the rows are spread evenly over that many sessions;
+    otherwise each session gets 5-15 points. The same seed always gives the same data."""
+    rng = random.Random(seed)
     data = []
     rows_generated = 0
-    
+    session_index = 0
+
     while rows_generated < num_rows:
         # Create a new session with a unique ID
-        session_id = str(uuid.uuid4())
-        
+        session_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
         # Random session length between 15 and 45 minutes (in seconds)
-        session_length = random.randint(15 * 60, 45 * 60)
-        
-        # Number of data points in this session (between 5 and 15)
-        num_points = random.randint(5, 15)
-        
+        session_length = rng.randint(15 * 60, 45 * 60)
+
+        # Number of data points in this session
+        if num_sessions:
+            remaining_sessions = max(1, num_sessions - session_index)
+            num_points = -(-(num_rows - rows_generated) // remaining_sessions)
+        else:
+            num_points = rng.randint(5, 15)
+        session_index += 1
+
         # Generate timestamps for this session
-        timestamps = sorted([random.randint(1, session_length) for _ in range(num_points)])
-        
+        timestamps = sorted(rng.uniform(1, session_length) for _ in range(num_points))
+
         # Create "emotion states" that tend to persist for a while
-        current_image_emotion = random.choice(image_emotions)
-        current_audio_emotion = random.choice(audio_emotions)
-        
+        current_image_emotion = rng.choice(image_emotions)
+        current_audio_emotion = rng.choice(audio_emotions)
+
         for timestamp in timestamps:
             # 30% chance to change the emotion at each timestamp
-            if random.random() < 0.3:
-                current_image_emotion = random.choice(image_emotions)
-            if random.random() < 0.3:
-                current_audio_emotion = random.choice(audio_emotions)
-                
+            if rng.random() < 0.3:
+                current_image_emotion = rng.choice(image_emotions)
+            if rng.random() < 0.3:
+                current_audio_emotion = rng.choice(audio_emotions)
+
             # Add the data point
             data.append({
                 'session_id': session_id,
@@ -43,21 +53,29 @@ def generate_emotion_session_data(num_rows=1000):
                 'image_result': current_image_emotion,
                 'audio_result': current_audio_emotion
             })
-            
+
             rows_generated += 1
             if rows_generated >= num_rows:
                 break
 
     return data
 
-# Generate 1000 rows of data
-emotion_data = generate_emotion_session_data(1000)
+def write_csv(emotion_data, csv_file_path="result_populated.csv"):
+    with open(csv_file_path, mode='w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["session_id", "timestamp", "image_result", "audio_result"])
+        for row in emotion_data:
+            writer.writerow([row['session_id'], f"{row['timestamp']:.6f}", row['image_result'], row['audio_result']])
 
-# Write to CSV string
-csv_file_path = "result_populated.csv"
-with open(csv_file_path, mode='w', newline='') as csv_file:
-    writer = csv.writer(csv_file)
-    writer.writerow(["session_id", "timestamp", "image_result", "audio_result"])
-    for row in emotion_data:
-        writer.writerow([row['session_id'], f"{row['timestamp']:.6f}", row['image_result'], row['audio_result']])
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic emotion session data to a CSV file.")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=None,
+                        help="number of sessions to spread the rows over (default: 5-15 rows per session)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default="result_populated.csv")
+    args = parser.parse_args()
 
+    # Generate the rows and write them to CSV
+    emotion_data = generate_emotion_session_data(args.rows, num_sessions=args.sessions, seed=args.seed)
+    write_csv(emotion_data, args.output)
@@ -0,0 +1,108 @@
+import numpy as np
+
+# Unified label space shared by both modalities; every score vector uses this order
+EMOTIONS = ("angry", "calm", "disgust", "fear", "happy", "neutral", "sad", "surprise")
+EMOTION_INDEX = {emotion: i for i, emotion in enumerate(EMOTIONS)}
+
+# The image and audio models name some emotions differently
+LABEL_ALIASES = {"fearful": "fear", "surprised": "surprise", "anger": "angry", "happiness": "happy",
+                 "sadness": "sad", "disgusted": "disgust"}
+
+
+def normalize_label(label):
+    return LABEL_ALIASES.get(label, label)
+
+
+def scores_to_vector(result):
+    """Turn a classifier output ([{"label", "score"}, ...]) into a float32 vector over EMOTIONS.
+
+    Labels outside the unified space are dropped and the rest renormalised,
+    so a top-k output still sums to one.
+    """
+    vector = np.zeros(len(EMOTIONS), dtype=np.float32)
+    for entry in result:
+        index = EMOTION_INDEX.get(normalize_label(entry["label"]))
+        if index is not None:
+            vector[index] += entry["score"]
+    total = vector.sum()
+    if total > 0:
+        vector /= total
+    return vector
+
+
+def vector_to_label(vector):
+    """Top emotion of a score vector, or None when it has no mass (no predicted label is in EMOTIONS)."""
+    vector = np.asarray(vector)
+    if not vector.sum() > 0:
+        return None
+    return EMOTIONS[int(np.argmax(vector))]
+
+
+def is_result(label):
+    """True for a classified label; missing (None/NaN) and "failed" results are not emotions."""
+    return isinstance(label, str) and label != "failed"
+
+
+def as_scores(result):
+    """Score vector of a classification, or None when there was none, it failed, or it has no mass."""
+    if result is None or isinstance(result, str) or not np.asarray(result).sum() > 0:
+        return None
+    return result
+
+
+def as_label(result):
+    """Label string for a score vector; None and "failed" pass through unchanged."""
+    return result if result is None or isinstance(result, str) else vector_to_label(result)
+
+
+def label_indices(labels):
+    """Map label strings to indices into EMOTIONS; missing, failed or unknown labels become -1."""
+    labels = np.asarray(labels, dtype=object)
+    if not len(labels):
+        return np.zeros(0, dtype=np.int64)
+    # Look up each distinct label once instead of once per row
+    uniques, inverse = np.unique(labels.astype(str), return_inverse=True)
+    codes = np.array([EMOTION_INDEX.get(normalize_label(label), -1) for label in uniques], dtype=np.int64)
+    return codes[inverse.reshape(-1)]
+
+
+def one_hot(labels):
+    """(rows x EMOTIONS) float32 matrix with a 1 at each row's label; unknown labels give an all-zero row."""
+    indices = label_indices(labels)
+    matrix = np.zeros((len(indices), len(EMOTIONS)), dtype=np.float32)
+    known = indices >= 0
+    matrix[np.flatnonzero(known), indices[known]] = 1.0
+    return matrix
+
+
+def label_matrix(df, column):
+    """One-hot matrix for a results column, e.g. label_matrix(df, "image_result")."""
+    return one_hot(df[column].astype(object).to_numpy())
+
+
+def score_matrix(df, column):
+    """(rows x EMOTIONS) float32 matrix from a stored score column, e.g. score_matrix(df, "image_scores").
+
+    Rows without a stored vector are NaN.
+    """
+    matrix = np.full((len(df), len(EMOTIONS)), np.nan, dtype=np.float32)
+    for i, vector in enumerate(df[column].to_numpy(dtype=object)):
+        if vector is not None and not (isinstance(vector, float) and np.isnan(vector)) and len(vector) == len(EMOTIONS):
+            matrix[i] = vector
+    return matrix
+
+
+def run_length_spans(times, labels):
+    """Collapse consecutive identical labels into (label, start, width) spans.
+
+    A span runs from the first sample of a run to the first sample of the
+    next run; the final span ends at the last sample.
+    """
+    times = np.asarray(times, dtype=float)
+    labels = np.asarray(labels, dtype=object)
+    if len(times) == 0:
+        return []
+    changes = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+    starts = np.concatenate(([0], changes))
+    ends = np.concatenate((changes, [len(times) - 1]))
+    return [(labels[s], times[s], times[e] - times[s]) for s, e in zip(starts, ends)]
@@ -0,0 +1,147 @@
+import numpy as np
+
+from emotion_labels import EMOTIONS, label_matrix, score_matrix, vector_to_label
+
+# Relative trust in each modality when both are present
+DEFAULT_WEIGHTS = (0.6, 0.4)
+# EMA weight of the newest tick; lower is smoother
+DEFAULT_ALPHA = 0.3
+# Probability that the fused emotion stays the same from one tick to the next (HMM smoothing)
+DEFAULT_STAY = 0.9
+
+
+def weighted_average(image_scores, audio_scores, weights=DEFAULT_WEIGHTS):
+    """Late fusion of (ticks x EMOTIONS) score matrices.
+
+    Rows that are NaN (modality missing for that tick) drop out and the other
+    modality's weight is renormalised; ticks with neither stay NaN.
+    """
+    stacked = np.stack([np.asarray(image_scores, dtype=np.float32), np.asarray(audio_scores, dtype=np.float32)])
+    present = ~np.isnan(stacked).any(axis=2)
+    w = np.asarray(weights, dtype=np.float32)[:, None] * present
+    total = w.sum(axis=0)
+    fused = (np.nan_to_num(stacked) * w[:, :, None]).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return fused / total[:, None]
+
+
+def _forward_fill(scores):
+    scores = np.array(scores, dtype=np.float32)
+    missing = np.isnan(scores).any(axis=1)
+    if not missing.any():
+        return scores
+    # Index of the last present row at each position
+    last = np.where(~missing, np.arange(len(scores)), 0)
+    np.maximum.accumulate(last, out=last)
+    filled = scores[last]
+    # Leading missing rows have nothing to copy: treat them as uniform
+    first = np.flatnonzero(~missing)
+    lead = first[0] if len(first) else len(scores)
+    filled[:lead] = 1.0 / len(EMOTIONS)
+    return filled
+
+
+def ema(scores, alpha=DEFAULT_ALPHA):
+    """Exponential moving average down the tick axis; missing ticks carry the previous scores."""
+    from scipy.signal import lfilter
+
+    scores = _forward_fill(scores)
+    if not len(scores):
+        return scores
+    # y[n] = alpha * x[n] + (1 - alpha) * y[n - 1], started at the first tick
+    zi = (1 - alpha) * scores[:1]
+    smoothed, _ = lfilter([alpha], [1.0, alpha - 1.0], scores, axis=0, zi=zi)
+    return smoothed.astype(np.float32)
+
+
+def hmm_smooth(scores, stay=DEFAULT_STAY):
+    """Most likely emotion sequence (Viterbi) treating the fused scores as emission probabilities.
+
+    `stay` is the probability of keeping the same emotion between ticks, the
+    rest is spread evenly over the others. Returns indices into EMOTIONS.
+    """
+    scores = _forward_fill(scores)
+    n, k = scores.shape
+    if not n:
+        return np.zeros(0, dtype=np.int64)
+    transition = np.full((k, k), (1.0 - stay) / (k - 1))
+    np.fill_diagonal(transition, stay)
+    log_transition = np.log(transition)
+    log_emission = np.log(np.clip(scores, 1e-6, None))
+
+    score = log_emission[0] - np.log(k)
+    backpointers = np.zeros((n, k), dtype=np.int64)
+    for t in range(1, n):
+        candidates = score[:, None] + log_transition
+        backpointers[t] = candidates.argmax(axis=0)
+        score = candidates.max(axis=0) + log_emission[t]
+
+    path = np.zeros(n, dtype=np.int64)
+    path[-1] = score.argmax()
+    for t in range(n - 1, 0, -1):
+        path[t - 1] = backpointers[t, path[t]]
+    return path
+
+
+def fuse_session(image_scores, audio_scores, weights=DEFAULT_WEIGHTS, smoothing="ema",
+                 alpha=DEFAULT_ALPHA, stay=DEFAULT_STAY):
+    """Fused emotion index per tick for one session's score matrices.
+
+    `smoothing` is "ema", "hmm" or None for the plain weighted average.
+    """
+    fused = weighted_average(image_scores, audio_scores, weights)
+    if smoothing == "hmm":
+        return hmm_smooth(fused, stay)
+    if smoothing == "ema":
+        fused = ema(fused, alpha)
+    else:
+        fused = _forward_fill(fused)
+    return fused.argmax(axis=1)
+
+
+def fuse_results(df, weights=DEFAULT_WEIGHTS, smoothing="ema", alpha=DEFAULT_ALPHA, stay=DEFAULT_STAY):
+    """Fused emotion per row of a results frame, smoothed within each session.
+
+    Stored score vectors (image_scores / audio_scores, see read_results) are
+    used where present; other rows fall back to one-hot labels, i.e. a
+    weighted vote.
+    """
+    image = _modality_matrix(df, "image")
+    audio = _modality_matrix(df, "audio")
+
+    fused = np.full(len(df), None, dtype=object)
+    times = df["timestamp"].to_numpy(dtype=float)
+    for rows in df.groupby("session_id", observed=True, sort=False).indices.values():
+        rows = rows[np.argsort(times[rows], kind="stable")]
+        indices = fuse_session(image[rows], audio[rows], weights, smoothing, alpha, stay)
+        fused[rows] = np.asarray(EMOTIONS, dtype=object)[indices]
+    return fused
+
+
+def _modality_matrix(df, modality):
+    matrix = label_matrix(df, f"{modality}_result")
+    # Missing or failed labels encode as all-zero rows; mark them as absent
+    matrix[matrix.sum(axis=1) == 0] = np.nan
+    if f"{modality}_scores" in df.columns:
+        scores = score_matrix(df, f"{modality}_scores")
+        stored = ~np.isnan(scores).any(axis=1) & (np.nan_to_num(scores).sum(axis=1) > 0)
+        matrix[stored] = scores[stored]
+    return matrix
+
+
+class FusionState:
+    """Online fusion for the capture loop: weighted average of the latest scores, then an EMA."""
+
+    def __init__(self, weights=DEFAULT_WEIGHTS, alpha=DEFAULT_ALPHA):
+        self.weights = weights
+        self.alpha = alpha
+        self.scores = None
+
+    def update(self, image_scores=None, audio_scores=None):
+        """Fold in one tick (either modality may be None) and return the fused label, or None."""
+        parts = [(w, s) for w, s in zip(self.weights, (image_scores, audio_scores)) if s is not None]
+        if parts:
+            total = sum(w for w, _ in parts)
+            tick = sum(w * np.asarray(s, dtype=np.float32) for w, s in parts) / total
+            self.scores = tick if self.scores is None else self.alpha * tick + (1 - self.alpha) * self.scores
+        return vector_to_label(self.scores) if self.scores is not None else None
@@ -1,56 +1,201 @@
+import asyncio
+import io
+import os
 import streamlit as st
 import pandas as pd
-from groq import Groq
+from groq import Groq, AsyncGroq
+from results_sink import read_results
+from result_cache import ResultCache
+from prompt_builder import fit_summaries, summarize_sessions, DEFAULT_TOKEN_BUDGET, PROMPT_VERSION
+from session_fanout import analyze_sessions, DEFAULT_MODEL
+from session_summary import SessionSummaryStore, DEFAULT_PATH as SUMMARY_PATH
 
-# Initialize the Groq client
-with open("groq_api.txt", "r") as file:
-    api_key = file.read().strip()
+ANALYSIS_CACHE_PATH = "analysis_cache.sqlite"
+ANALYSIS_CACHE_TTL = 7 * 24 * 3600
+ANALYSIS_CACHE_BYTES = 64 * 1024 * 1024
+# Per-session mode sends one request per session, so large archives are analysed a page at a time
+SESSIONS_PER_PAGE = 20
 
-client = Groq(
-    api_key=api_key,
-)
+
+# Streamlit reruns this script on every interaction; these are created once per server process
+@st.cache_resource
+def get_api_key():
+    with open("groq_api.txt", "r") as file:
+        return file.read().strip()
+
+
+@st.cache_resource
+def get_client():
+    return Groq(api_key=get_api_key())
+
+
+@st.cache_resource
+def get_analysis_cache():
+    return ResultCache(path=ANALYSIS_CACHE_PATH, ttl=ANALYSIS_CACHE_TTL, max_disk_bytes=ANALYSIS_CACHE_BYTES)
+
+
+@st.cache_data(max_entries=8)
+def load_upload(content):
+    return read_results(io.BytesIO(content), columns=["session_id", "timestamp", "image_result", "audio_result"])
+
+
+@st.cache_data(max_entries=8)
+def summarize_upload(content):
+    return summarize_sessions(load_upload(content))
+
+
+def summary_version(path):
+    """Changes whenever the summary index does; the WAL file is included because writers append there first."""
+    parts = [os.path.abspath(path)]
+    for name in (path, path + "-wal"):
+        if os.path.exists(name):
+            stat = os.stat(name)
+            parts += [stat.st_mtime_ns, stat.st_size]
+    return "|".join(map(str, parts))
+
+
+@st.cache_data(max_entries=8)
+def load_summaries(path, version):
+    store = SessionSummaryStore(path)
+    try:
+        return store.summaries()
+    finally:
+        store.close()
+
+
+def analysis_key(mode, *settings):
+    """Cache namespace for one analysis: model, prompt version, mode and the settings that change the prompt."""
+    return "|".join(map(str, (DEFAULT_MODEL, PROMPT_VERSION, mode) + settings))
+
+
+client = get_client()
+analysis_cache = get_analysis_cache()
 
 # Streamlit app
 st.title("Emotion Analysis with Groq")
 
-# File uploader
-uploaded_file = st.file_uploader("Upload your CSV file", type=["csv"])
-
-if uploaded_file is not None:
-    # Load the dataset
-    data = pd.read_csv(uploaded_file)
-    st.write("Dataset Preview:")
-    st.write(data.head())
-
-    # Sample the dataset to reduce token size
-    sampled_data = data.sample(frac=0.25, random_state=42)
-    data_string = sampled_data.to_csv(index=False)
-
-    # Ensure the token count is less than 6000
-    # if len(data_string.split()) > 6000:
-    #     while len(data_string.split()) > 6000:
-    #         data_string = sampled_data.to_csv(index=False)
-    #         if len(data_string.split()) <= 6000:
-    #             break
-    # else:
-        # Update the chat completion request
-    chat_completion = client.chat.completions.create(
-        messages=[
-            {
-                "role": "user",
-                "content": (
-                    "You are given a dataset with session_id, timestamp, image_result, audio_result. "
-                    "This is the emotion classified using images and audio of a particular child. "
-                    "You have to analyze each session separately. Each session will last no longer than 45 minutes. "
-                    "Give inference of the child's emotion and a comprehensive emotional profile for this child aesthetically, "
-                    "so that a doctor can use it. The data starts from here:\n" + data_string
-                ),
-            }
-        ],
-        model="deepseek-r1-distill-qwen-32b",
-        stream=False,
-    )
-
-    # Display the result
-    st.subheader("Emotion Analysis Result:")
-    st.write(chat_completion.choices[0].message.content)
\ No newline at end of file
+source = st.sidebar.radio("Data source", ["Upload CSV", "Session summary index"])
+summaries = None
+
+if source == "Upload CSV":
+    # File uploader
+    uploaded_file = st.file_uploader("Upload your CSV file", type=["csv"])
+    if uploaded_file is not None:
+        # Load the dataset
+        content = uploaded_file.getvalue()
+        data = load_upload(content)
+        st.write("Dataset Preview:")
+        st.write(data.head())
+        summaries = summarize_upload(content)
+else:
+    # Per-session aggregates kept current by the capture loop: one row per session, no raw rows read
+    summary_path = st.sidebar.text_input("Summary database", SUMMARY_PATH)
+    if os.path.exists(summary_path):
+        content = summary_version(summary_path).encode()
+        summaries = load_summaries(summary_path, content)
+        st.write(f"{len(summaries)} sessions in the summary index:")
+        st.write(pd.DataFrame(summaries, columns=["session_id", "duration", "samples", "agreement"]).head())
+    else:
+        st.warning(f"No summary database at {summary_path}")
+
+if summaries:
+    mode = st.sidebar.radio("Analysis mode", ["Per session (streaming)", "Single request"])
+    refresh = st.sidebar.button("Re-run analysis")
+
+    if mode == "Single request":
+        # Compress each session into emotion segments and statistics that fit the context window
+        token_budget = st.sidebar.number_input("Prompt token budget", min_value=500, max_value=32000,
+                                               value=DEFAULT_TOKEN_BUDGET, step=500)
+        key = analysis_key("single", int(token_budget))
+        result = None if refresh else analysis_cache.get(key, content)
+
+        if result is None:
+            prompt, prompt_info = fit_summaries(summaries, token_budget=int(token_budget))
+            st.caption(f"Prompt: {prompt_info['tokens']} tokens covering {prompt_info['sessions']} sessions"
+                       + (f" ({prompt_info['omitted_sessions']} omitted)" if prompt_info['omitted_sessions'] else ""))
+
+            chat_completion = client.chat.completions.create(
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt,
+                    }
+                ],
+                model=DEFAULT_MODEL,
+                stream=False,
+            )
+            result = chat_completion.choices[0].message.content
+            analysis_cache.put(key, content, result)
+        else:
+            st.caption("Cached analysis for this data")
+
+        # Display the result
+        st.subheader("Emotion Analysis Result:")
+        st.write(result)
+    else:
+        # One concurrent request per session, streamed into its own panel, then a short merge call
+        max_concurrency = st.sidebar.slider("Concurrent requests", 1, 16, 4)
+        requests_per_minute = st.sidebar.number_input("Requests per minute limit (0 = none)", 0, 1000, 30)
+        page_size = int(st.sidebar.number_input("Sessions per run", 1, 200, SESSIONS_PER_PAGE))
+        pages = (len(summaries) + page_size - 1) // page_size
+        page = int(st.sidebar.number_input("Page", 1, pages, 1)) if pages > 1 else 1
+        all_sessions = len(summaries)
+        summaries = summaries[(page - 1) * page_size:page * page_size]
+        if pages > 1:
+            st.caption(f"Analysing sessions {(page - 1) * page_size + 1}-{(page - 1) * page_size + len(summaries)} "
+                       f"of {all_sessions}; pick another page in the sidebar for the rest")
+
+        st.subheader("Per-session profiles:")
+        session_panels = {}
+        for summary in summaries:
+            with st.expander(f"Session {summary['session_id'][:8]}"):
+                session_panels[summary["session_id"]] = st.empty()
+        st.subheader("Emotion Analysis Result:")
+        merge_panel = st.empty()
+
+        key = analysis_key("per_session", page_size, page)
+        cached = None if refresh else analysis_cache.get(key, content)
+
+        if cached is not None:
+            for session_id, text in cached["profiles"].items():
+                if session_id in session_panels:
+                    session_panels[session_id].markdown(text)
+            merge_panel.markdown(cached["merged"])
+        else:
+            session_texts = {summary["session_id"]: "" for summary in summaries}
+            merged_text = []
+
+            def on_session_token(session_id, token):
+                session_texts[session_id] += token
+                session_panels[session_id].markdown(session_texts[session_id])
+
+            def on_merge_token(token):
+                merged_text.append(token)
+                merge_panel.markdown("".join(merged_text))
+
+            # A retried request streams its answer again from the start
+            def on_session_retry(session_id):
+                session_texts[session_id] = ""
+                session_panels[session_id].empty()
+
+            def on_merge_retry():
+                merged_text.clear()
+                merge_panel.empty()
+
+            # The async client is bound to the event loop of this run, so it is not cached
+            async_client = AsyncGroq(api_key=get_api_key())
+            profiles, merged, failed = asyncio.run(analyze_sessions(async_client, summaries,
+                                                                    on_session_token=on_session_token,
+                                                                    on_merge_token=on_merge_token,
+                                                                    max_concurrency=max_concurrency,
+                                                                    requests_per_minute=requests_per_minute or None,
+                                                                    on_session_retry=on_session_retry,
+                                                                    on_merge_retry=on_merge_retry))
+            for session_id, error in failed.items():
+                session_panels[session_id].error(f"Analysis failed: {error}")
+            if failed:
+                st.warning(f"{len(failed)} of {len(summaries)} sessions failed and are not in the merged profile; "
+                           "re-run the analysis to retry them")
+            else:
+                # Only complete analyses are cached, so a re-run retries the failed sessions
+                analysis_cache.put(key, content, {"profiles": profiles, "merged": merged})
@@ -0,0 +1,244 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+import aiohttp
+
+from result_cache import ResultCache, DEFAULT_PATH as DEFAULT_CACHE_PATH
+
+DEFAULT_BASE_URL = "https://router.huggingface.co/hf-inference/models"
+TOKEN_FILE = "huggingface_token.txt"
+
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class InferenceError(Exception):
+    pass
+
+
+class CircuitOpenError(InferenceError):
+    pass
+
+
+def read_token(path=TOKEN_FILE):
+    """Return the API token from $HF_TOKEN or the token file; InferenceError if there is neither."""
+    token = os.environ.get("HF_TOKEN")
+    if token:
+        return token.strip()
+    try:
+        with open(path, "r") as token_file:
+            return token_file.read().strip()
+    except OSError as e:
+        raise InferenceError(f"No API token: set $HF_TOKEN or create {path} ({e})") from e
+
+
+def read_input(data):
+    """Accept bytes or a file path and return the bytes to upload."""
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data)
+    with open(data, "rb") as f:
+        return f.read()
+
+
+class CircuitBreaker:
+    """Stop calling a failing endpoint for `reset_timeout` seconds after consecutive failures."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                # Let exactly one request probe whether the endpoint recovered
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class AsyncInferenceClient:
+    """Async client for the HF inference API with a pooled session, bounded concurrency and retries."""
+
+    def __init__(self, token=None, base_url=None, max_concurrency=8, max_retries=4,
+                 backoff_base=0.5, backoff_max=8.0, timeout=30.0):
+        self.token = token
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self._session = None
+        self._semaphore = None
+
+    def _ensure_session(self):
+        # Created lazily so the session and semaphore bind to the running event loop
+        if self._session is None:
+            headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector, headers=headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    def _backoff(self, attempt, retry_after=None):
+        # Full jitter keeps many clients from retrying in lockstep
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    async def classify(self, model_id, data):
+        """POST raw bytes to a classification model and return its [{label, score}, ...] output."""
+        session = self._ensure_session()
+        url = f"{self.base_url}/{model_id}"
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                retry_after = None
+                try:
+                    async with session.post(url, data=data) as response:
+                        if response.status < 400:
+                            return await response.json()
+                        body = await response.text()
+                        error = InferenceError(f"HTTP {response.status} from {model_id}: {body[:200]}")
+                        if response.status not in RETRY_STATUSES:
+                            raise error
+                        retry_after = response.headers.get("Retry-After")
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = InferenceError(f"{type(e).__name__} calling {model_id}: {e}")
+
+                if attempt == self.max_retries:
+                    raise error
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+# Shared client running on one background event loop, used by the synchronous callers
+_loop = None
+_client = None
+_cache = None
+_breakers = {}
+_shared_lock = threading.Lock()
+
+
+def _get_loop():
+    global _loop
+    if _loop is None:
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name="hf-client-loop", daemon=True).start()
+        _loop = loop
+    return _loop
+
+
+def get_client():
+    """Return the process-wide client, configured from $HF_INFERENCE_URL for stub servers."""
+    global _client
+    with _shared_lock:
+        if _client is None:
+            base_url = os.environ.get("HF_INFERENCE_URL")
+            # A local stub server does not need a token
+            token = read_token() if base_url is None else os.environ.get("HF_TOKEN")
+            _client = AsyncInferenceClient(token=token, base_url=base_url)
+            _get_loop()
+        return _client
+
+
+def get_cache():
+    """Return the shared result cache, or None when $INFERENCE_CACHE is "0"."""
+    global _cache
+    if os.environ.get("INFERENCE_CACHE", "1") == "0":
+        return None
+    with _shared_lock:
+        if _cache is None:
+            _cache = ResultCache(os.environ.get("INFERENCE_CACHE_PATH", DEFAULT_CACHE_PATH))
+        return _cache
+
+
+def get_breaker(model_id):
+    with _shared_lock:
+        if model_id not in _breakers:
+            _breakers[model_id] = CircuitBreaker()
+        return _breakers[model_id]
+
+
+def classify(model_id, data, fallback=None):
+    """Classify bytes through the shared client, falling back to a local model when the API is down.
+
+    `fallback` is called with the same bytes when retries are exhausted or the
+    model's circuit breaker is open. Without a fallback the error is raised.
+    Outputs are cached by content hash, so identical inputs are only sent once.
+    """
+    cache = get_cache()
+    if cache is not None:
+        output = cache.get(model_id, data)
+        if output is not None:
+            return output
+
+    output = _classify_uncached(model_id, data, fallback)
+    if cache is not None:
+        cache.put(model_id, data, output)
+    return output
+
+
+def _classify_uncached(model_id, data, fallback):
+    breaker = get_breaker(model_id)
+    try:
+        client = get_client()
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {model_id}")
+    except InferenceError as e:
+        # No token configured or the circuit is open: the endpoint was not called
+        error = e
+    else:
+        try:
+            output = asyncio.run_coroutine_threadsafe(client.classify(model_id, data), _get_loop()).result()
+            breaker.record_success()
+            return output
+        except Exception as e:
+            # Any error ends a half-open trial, otherwise the breaker would wait on it forever
+            breaker.record_failure()
+            error = e
+
+    if fallback is None:
+        raise error
+    print(f"{error}; using local model")
+    return fallback(data)
@@ -1,16 +1,34 @@
-from huggingface_hub import InferenceClient
+import io
 
-with open("huggingface_token.txt", "r") as token_file:
-    api_key = token_file.read().strip()
+import hf_client
+import metrics
+from emotion_labels import scores_to_vector
 
-client = InferenceClient(
-    provider="hf-inference",
-    api_key=api_key,
-)
+MODEL_ID = "dima806/facial_emotions_image_detection"
 
+def _classify_locally(image_bytes):
+    # Circuit open or retries exhausted: run the same model through transformers
+    from PIL import Image
+    from image_classification import classify_image
+    return classify_image(Image.open(io.BytesIO(image_bytes)))
+
+def _classify(imagefile):
+    return hf_client.classify(MODEL_ID, hf_client.read_input(imagefile), fallback=_classify_locally)
+
+@metrics.timed("classify_image")
 def classify_image_call(imagefile):
     try:
-        output = client.image_classification(imagefile, model="dima806/facial_emotions_image_detection")
+        output = _classify(imagefile)
         return output[0]['label']
     except Exception as e:
-        return "failed"
\ No newline at end of file
+        print(f"Image classification failed: {e}")
+        return "failed"
+
+@metrics.timed("classify_image")
+def classify_image_scores(imagefile):
+    """Scores over emotion_labels.EMOTIONS as a float32 vector, or "failed"."""
+    try:
+        return scores_to_vector(_classify(imagefile))
+    except Exception as e:
+        print(f"Image classification failed: {e}")
+        return "failed"
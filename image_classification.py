@@ -1,17 +1,34 @@
-# Use a pipeline as a high-level helper
-from transformers import pipeline
+from inference_engine import get_engine
+from emotion_labels import scores_to_vector
 
-pipe = pipeline("image-classification", model="dima806/facial_emotions_image_detection")
+MODEL_ID = "dima806/facial_emotions_image_detection"
 
-# Load model directly
-from transformers import AutoImageProcessor, AutoModelForImageClassification
-
-processor = AutoImageProcessor.from_pretrained("dima806/facial_emotions_image_detection")
-model = AutoModelForImageClassification.from_pretrained("dima806/facial_emotions_image_detection")
+# One shared pipeline per process, loaded on first use; the unused AutoModel copy is no longer loaded
+engine = get_engine("image-classification", MODEL_ID)
 
 
 def classify_image(imagefile):
-    emotion = pipe(imagefile)
+    emotion = engine.classify(imagefile)
     print(emotion)
     return emotion
 
+
+def classify_image_batch(imagefiles):
+    """Classify many images (paths, URLs or PIL images) in batched forward passes."""
+    return engine.classify_batch(imagefiles)
+
+
+def classify_image_scores(imagefile):
+    """Full score vector over emotion_labels.EMOTIONS, micro-batched with concurrent callers."""
+    return scores_to_vector(engine.classify(imagefile, top_k=len(engine.labels)))
+
+
+def classify_image_scores_batch(imagefiles):
+    """Full score vectors over emotion_labels.EMOTIONS, one float32 array per input."""
+    results = engine.classify_batch(imagefiles, top_k=len(engine.labels))
+    return [scores_to_vector(result) for result in results]
+
+
+def warmup(background=False):
+    """Load the model ahead of the first classification."""
+    return engine.warmup(background=background)
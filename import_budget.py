@@ -0,0 +1,41 @@
+import argparse
+import subprocess
+import sys
+
+# Modules that must stay cheap to import: model loading has to wait for first use or warmup()
+MODULES = ["inference_engine", "audio_classification", "image_classification"]
+
+# Seconds allowed for each module, measured in a fresh interpreter
+DEFAULT_BUDGET = 0.5
+
+MEASURE = (
+    "import time; start = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def measure_import_time(module):
+    """Import a module in a fresh interpreter and return the elapsed seconds."""
+    result = subprocess.run([sys.executable, "-c", MEASURE.format(module=module)],
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that classification modules import within budget.")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="seconds allowed per module")
+    args = parser.parse_args()
+
+    over_budget = False
+    for module in args.modules:
+        elapsed = measure_import_time(module)
+        status = "ok" if elapsed <= args.budget else "OVER BUDGET"
+        print(f"{module:<25} {elapsed:.3f}s  {status}")
+        over_budget |= elapsed > args.budget
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
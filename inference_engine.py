@@ -0,0 +1,172 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+def default_options():
+    """Engine options taken from the environment so deployments can tune them without code changes."""
+    return {
+        "max_batch_size": int(os.environ.get("INFERENCE_BATCH_SIZE", 8)),
+        "max_wait_ms": float(os.environ.get("INFERENCE_MAX_WAIT_MS", 20)),
+        "num_threads": int(os.environ["INFERENCE_THREADS"]) if os.environ.get("INFERENCE_THREADS") else None,
+        "quantize": os.environ.get("INFERENCE_QUANTIZE", "0") == "1",
+    }
+
+
+class InferenceEngine:
+    """One loaded transformers pipeline shared by every caller, with dynamic micro-batching.
+
+    `classify_batch` runs a list of items through the model directly. `submit`
+    and `classify` queue single items; a batcher thread collects up to
+    `max_batch_size` of them or waits at most `max_wait_ms`, then runs one
+    forward pass for the whole batch.
+
+    The model is loaded lazily on first use (or by `warmup`), so constructing
+    an engine and importing the modules that own one is cheap.
+    """
+
+    def __init__(self, task, model_id, max_batch_size=8, max_wait_ms=20, num_threads=None, quantize=False):
+        self.task = task
+        self.model_id = model_id
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.num_threads = num_threads
+        self.quantize = quantize
+
+        self._pipe = None
+        self._load_lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._infer_lock = threading.Lock()
+        self._batcher = None
+        self._batcher_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._pipe is not None
+
+    @property
+    def pipe(self):
+        if self._pipe is None:
+            with self._load_lock:
+                if self._pipe is None:
+                    self._pipe = self._load()
+        return self._pipe
+
+    def _load(self):
+        # Heavy imports live here so importing this module never pulls in torch
+        from transformers import pipeline
+
+        start = time.perf_counter()
+        if self.num_threads:
+            import torch
+            torch.set_num_threads(self.num_threads)
+
+        pipe = pipeline(self.task, model=self.model_id)
+
+        if self.quantize:
+            # int8 dynamic quantization of the Linear layers; weights shrink ~4x on CPU
+            import torch
+            pipe.model = torch.quantization.quantize_dynamic(
+                pipe.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        print(f"Loaded {self.model_id} in {time.perf_counter() - start:.1f}s")
+        return pipe
+
+    def warmup(self, background=False):
+        """Load the model now. With background=True, load on a daemon thread and return it."""
+        if not background:
+            self.pipe
+            return None
+        thread = threading.Thread(target=lambda: self.pipe, name=f"warmup-{self.task}", daemon=True)
+        thread.start()
+        return thread
+
+    def classify_batch(self, items, **pipe_kwargs):
+        """Classify a list of items, returning one result list per item.
+
+        Extra keyword arguments go to the pipeline call, e.g. top_k.
+        """
+        items = list(items)
+        if not items:
+            return []
+        with self._infer_lock:
+            results = self.pipe(items, batch_size=self.max_batch_size, **pipe_kwargs)
+        # A single-item batch may come back unwrapped
+        if len(items) == 1 and results and isinstance(results[0], dict):
+            results = [results]
+        return results
+
+    def submit(self, item, **pipe_kwargs):
+        """Queue a single item for micro-batched inference and return a Future for its result.
+
+        Items are only batched with others submitted with the same pipe_kwargs.
+        """
+        self._ensure_batcher()
+        future = Future()
+        self._requests.put((item, pipe_kwargs, future))
+        return future
+
+    def classify(self, item, **pipe_kwargs):
+        return self.submit(item, **pipe_kwargs).result()
+
+    @property
+    def labels(self):
+        """Every label the model can output, in the model's own index order."""
+        id2label = self.pipe.model.config.id2label
+        return [id2label[i] for i in sorted(id2label)]
+
+    def _ensure_batcher(self):
+        if self._batcher is not None:
+            return
+        with self._batcher_lock:
+            if self._batcher is None:
+                self._batcher = threading.Thread(target=self._batch_loop, name=f"batcher-{self.task}", daemon=True)
+                self._batcher.start()
+
+    def _batch_loop(self):
+        while True:
+            batch = [self._requests.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Skip requests whose caller already cancelled them, then run one pass per distinct set of kwargs
+            groups = {}
+            for item, pipe_kwargs, future in batch:
+                if future.set_running_or_notify_cancel():
+                    key = tuple(sorted(pipe_kwargs.items()))
+                    groups.setdefault(key, []).append((item, future))
+            for key, live in groups.items():
+                try:
+                    results = self.classify_batch([item for item, _ in live], **dict(key))
+                except Exception as e:
+                    for _, future in live:
+                        future.set_exception(e)
+                    continue
+                for (_, future), result in zip(live, results):
+                    future.set_result(result)
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(task, model_id, **options):
+    """Return the process-wide engine for a model; the model itself loads on first use."""
+    key = (task, model_id)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            settings = default_options()
+            settings.update(options)
+            engine = InferenceEngine(task, model_id, **settings)
+            _engines[key] = engine
+        return engine
@@ -0,0 +1,267 @@
+import csv
+import io
+import os
+import sqlite3
+import time
+from collections import Counter, deque
+
+import pandas as pd
+import streamlit as st
+
+from emotion_labels import EMOTIONS, EMOTION_INDEX, normalize_label
+
+DEFAULT_RESULTS = "classification_results.csv"
+DEFAULT_WINDOW = 300
+DEFAULT_REFRESH = 0.5
+# Rows read per poll at most, so a large backlog is worked off over several refreshes
+MAX_ROWS_PER_POLL = 5000
+# Rows of history loaded when the dashboard starts (CSV: estimated from the average line length)
+HISTORY_ROWS = 2000
+CSV_BYTES_PER_ROW = 96
+# Sessions with no new rows for this long are dropped from the dashboard
+IDLE_SECONDS = 600
+
+MODALITIES = ("image", "audio", "fused")
+
+
+def _parse_row(row):
+    parsed = {"session_id": row["session_id"], "timestamp": float(row["timestamp"])}
+    for modality in MODALITIES:
+        parsed[f"{modality}_result"] = row.get(f"{modality}_result") or None
+    return parsed
+
+
+class CsvTail:
+    """Read rows appended to a CSV results file, starting from a byte offset.
+
+    A half-written last line stays unread until its newline arrives. If the
+    file shrinks (replaced or truncated) it is read again from the header.
+    """
+
+    def __init__(self, path, history=HISTORY_ROWS):
+        self.path = path
+        self.history = history
+        self.offset = None
+        self.columns = None
+
+    def _start(self, file):
+        header = file.readline()
+        self.columns = next(csv.reader([header.decode()]))
+        # Start near the end and skip the partial line the seek lands in
+        start = max(file.tell(), os.fstat(file.fileno()).st_size - self.history * CSV_BYTES_PER_ROW)
+        if start > file.tell():
+            file.seek(start - 1)
+            file.readline()
+        self.offset = file.tell()
+
+    def poll(self, max_rows=MAX_ROWS_PER_POLL):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "rb") as file:
+            if self.offset is None or os.fstat(file.fileno()).st_size < self.offset:
+                if os.fstat(file.fileno()).st_size == 0:
+                    return []
+                self._start(file)
+            file.seek(self.offset)
+            lines = []
+            while len(lines) < max_rows:
+                line = file.readline()
+                if not line.endswith(b"\n"):
+                    break
+                lines.append(line.decode())
+                self.offset += len(line)
+        return [_parse_row(row) for row in csv.DictReader(io.StringIO("".join(lines)), fieldnames=self.columns)]
+
+
+class SQLiteTail:
+    """Read rows inserted into a SQLiteSink database after the last seen rowid."""
+
+    def __init__(self, path, history=HISTORY_ROWS):
+        self.path = path
+        self.history = history
+        self.rowid = None
+        self._conn = None
+
+    def poll(self, max_rows=MAX_ROWS_PER_POLL):
+        if self._conn is None:
+            if not os.path.exists(self.path):
+                return []
+            # Read-only: the capture loop stays the only writer of the WAL database
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        if self.rowid is None:
+            latest = self._conn.execute("SELECT MAX(rowid) FROM results").fetchone()[0] or 0
+            self.rowid = max(0, latest - self.history)
+        cursor = self._conn.execute(
+            "SELECT r.rowid, s.session_id, r.timestamp, li.label, la.label, lf.label FROM results r "
+            "JOIN sessions s ON s.id = r.session "
+            "LEFT JOIN labels li ON li.id = r.image_result "
+            "LEFT JOIN labels la ON la.id = r.audio_result "
+            "LEFT JOIN labels lf ON lf.id = r.fused_result "
+            "WHERE r.rowid > ? ORDER BY r.rowid LIMIT ?", (self.rowid, max_rows))
+        rows = []
+        for rowid, session_id, timestamp, image, audio, fused in cursor:
+            rows.append({"session_id": session_id, "timestamp": timestamp,
+                         "image_result": image, "audio_result": audio, "fused_result": fused})
+            self.rowid = rowid
+        return rows
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def open_tail(path, history=HISTORY_ROWS):
+    """Tail for the sink format of `path`; Parquet files are unreadable until closed, so they cannot be tailed."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".sqlite", ".db"):
+        return SQLiteTail(path, history)
+    if extension == ".parquet":
+        raise ValueError("Parquet results can only be read once the sink is closed; use a .csv or .sqlite sink")
+    return CsvTail(path, history)
+
+
+class RollingWindow:
+    """The last `size` rows of one session, with label and transition counts updated per row.
+
+    Appending a row adds its counts and subtracts those of the row it evicts,
+    so the charts cost the same however long the session has been running.
+    """
+
+    def __init__(self, size=DEFAULT_WINDOW):
+        self.rows = deque(maxlen=size)
+        self.counts = {modality: Counter() for modality in MODALITIES}
+        self.transitions = {modality: Counter() for modality in MODALITIES}
+        self.version = 0
+        self.updated = time.monotonic()
+
+    def append(self, row):
+        labels = {modality: normalize_label(row[f"{modality}_result"]) for modality in MODALITIES}
+        if len(self.rows) == self.rows.maxlen:
+            oldest = self.rows[0][1]
+            following = self.rows[1][1] if len(self.rows) > 1 else None
+            for modality in MODALITIES:
+                self._count(self.counts[modality], oldest[modality], -1)
+                if following is not None:
+                    self._count(self.transitions[modality], (oldest[modality], following[modality]), -1)
+        if self.rows:
+            previous = self.rows[-1][1]
+            for modality in MODALITIES:
+                self._count(self.transitions[modality], (previous[modality], labels[modality]), 1)
+        for modality in MODALITIES:
+            self._count(self.counts[modality], labels[modality], 1)
+        self.rows.append((row["timestamp"], labels))
+        self.version += 1
+        self.updated = time.monotonic()
+
+    @staticmethod
+    def _count(counter, key, amount):
+        if key is None or isinstance(key, tuple) and None in key:
+            return
+        counter[key] += amount
+        if counter[key] <= 0:
+            del counter[key]
+
+    def distribution(self):
+        return pd.DataFrame({modality: self.counts[modality] for modality in ("image", "audio")}).fillna(0)
+
+    def transition_matrix(self, modality):
+        categories = sorted({label for pair in self.transitions[modality] for label in pair})
+        matrix = pd.DataFrame(0, index=categories, columns=categories)
+        for (before, after), count in self.transitions[modality].items():
+            matrix.loc[before, after] = count
+        return matrix
+
+    def timeline(self):
+        """Emotion index (position in EMOTIONS) per modality over the window; unknown labels are left out."""
+        times = [timestamp for timestamp, _ in self.rows]
+        return pd.DataFrame({modality: [EMOTION_INDEX.get(labels[modality]) for _, labels in self.rows]
+                             for modality in MODALITIES}, index=pd.Index(times, name="timestamp"), dtype=float)
+
+
+class LiveState:
+    """Tail plus per-session windows; kept in st.session_state so reruns continue from the same offset."""
+
+    def __init__(self, path, window):
+        self.tail = open_tail(path)
+        self.window = window
+        self.sessions = {}
+
+    def poll(self):
+        rows = self.tail.poll()
+        for row in rows:
+            session = self.sessions.get(row["session_id"])
+            if session is None:
+                session = self.sessions[row["session_id"]] = RollingWindow(self.window)
+            session.append(row)
+        now = time.monotonic()
+        for session_id in [key for key, session in self.sessions.items() if now - session.updated > IDLE_SECONDS]:
+            del self.sessions[session_id]
+        return len(rows)
+
+    def active(self, count):
+        """The `count` sessions that received rows most recently."""
+        return sorted(self.sessions.items(), key=lambda item: item[1].updated, reverse=True)[:count]
+
+
+def get_state(path, window):
+    key = (os.path.abspath(path), window)
+    state = st.session_state.get("live_state")
+    if state is None or st.session_state.get("live_state_key") != key:
+        state = st.session_state["live_state"] = LiveState(path, window)
+        st.session_state["live_state_key"] = key
+    return state
+
+
+def main():
+    st.title("Live Emotion Monitor")
+
+    path = st.sidebar.text_input("Results file (.csv or .sqlite)", DEFAULT_RESULTS)
+    window = st.sidebar.number_input("Rows per session window", min_value=20, max_value=5000, value=DEFAULT_WINDOW,
+                                     step=20)
+    shown = st.sidebar.slider("Sessions shown", 1, 8, 3)
+    refresh = st.sidebar.slider("Refresh interval (s)", 0.1, 5.0, DEFAULT_REFRESH)
+
+    try:
+        state = get_state(path, int(window))
+    except ValueError as e:
+        st.error(str(e))
+        return
+
+    status = st.empty()
+    st.caption("Timeline: " + ", ".join(f"{i} = {emotion}" for i, emotion in enumerate(EMOTIONS)))
+    # Placeholders are created once; each refresh redraws only the sessions that received rows
+    slots = []
+    for _ in range(shown):
+        header = st.empty()
+        columns = st.columns(2)
+        slots.append({"header": header, "distribution": columns[0].empty(), "transitions": columns[1].empty(),
+                      "timeline": st.empty(), "drawn": None})
+
+    # Streamlit stops this loop when a widget changes and reruns the script, which resumes the same tail
+    while True:
+        started = time.perf_counter()
+        new_rows = state.poll()
+        active = state.active(shown)
+        for slot, (session_id, session) in zip(slots, active):
+            drawn = (session_id, session.version)
+            if slot["drawn"] == drawn:
+                continue
+            last_timestamp = session.rows[-1][0]
+            slot["header"].subheader(f"Session {session_id[:8]} · {len(session.rows)} rows · t={last_timestamp:.1f}s")
+            slot["distribution"].bar_chart(session.distribution())
+            slot["transitions"].dataframe(session.transition_matrix("fused" if session.counts["fused"] else "image"))
+            slot["timeline"].line_chart(session.timeline())
+            slot["drawn"] = drawn
+        for slot in slots[len(active):]:
+            if slot["drawn"] is not None:
+                for name in ("header", "distribution", "transitions", "timeline"):
+                    slot[name].empty()
+                slot["drawn"] = None
+        elapsed = time.perf_counter() - started
+        status.caption(f"{len(state.sessions)} active sessions, {new_rows} new rows, refresh took {elapsed * 1000:.0f} ms")
+        time.sleep(max(0.0, refresh - elapsed))
+
+
+if __name__ == "__main__":
+    main()
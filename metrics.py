@@ -0,0 +1,286 @@
+import bisect
+import functools
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, from JPEG encodes up to slow API round trips
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_text(labelnames, key, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, key)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=(), registry=None):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonic total, incremented directly or read at scrape time from a running total with `set_function`."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=(), registry=None):
+        super().__init__(name, help_text, labelnames, registry)
+        self._values = {}
+        self._functions = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_function(self, fn, **labels):
+        with self._lock:
+            self._functions[self._key(labels)] = fn
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = fn()
+            except Exception:
+                continue
+        return [f"{self.name}{_label_text(self.labelnames, key)} {value}" for key, value in values.items()]
+
+
+class Gauge(_Metric):
+    """A value that is set directly, or read from a callback at scrape time with `set_function`."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), registry=None):
+        super().__init__(name, help_text, labelnames, registry)
+        self._values = {}
+        self._functions = {}
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, fn, **labels):
+        with self._lock:
+            self._functions[self._key(labels)] = fn
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                values[key] = fn()
+            except Exception:
+                continue
+        return [f"{self.name}{_label_text(self.labelnames, key)} {value}" for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket latency histogram; also keeps the last observation per label set for the tick log."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, help_text, labelnames, registry)
+        self.buckets = tuple(buckets)
+        self._series = {}  # key -> [bucket counts..., +Inf count, sum]
+        self.last = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+            self.last[key] = value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = 'le="%s"' % ("+Inf" if bound == float("inf") else repr(bound))
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}")
+            labels = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {values[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        """Prometheus text exposition format."""
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class SampleRate:
+    """Samples written in the last `window` seconds, scaled to a per-minute rate."""
+
+    def __init__(self, window=60.0):
+        self.window = window
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def mark(self):
+        now = time.monotonic()
+        with self._lock:
+            self._times.append(now)
+            self._trim(now)
+
+    def per_minute(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            return len(self._times) * 60.0 / self.window
+
+    def _trim(self, now):
+        while self._times and self._times[0] < now - self.window:
+            self._times.popleft()
+
+
+# Metrics of the capture loop, shared by every entry point in the process
+STAGE_SECONDS = Histogram("capture_stage_seconds", "Latency of each capture loop stage.", ["stage"])
+STAGE_FAILURES = Counter("capture_stage_failures_total",
+                         "Stage calls that raised, returned nothing, or returned \"failed\".", ["stage"])
+ROWS_WRITTEN = Counter("capture_rows_written_total", "Result rows written to the results sink.")
+QUEUE_DEPTH = Gauge("capture_queue_depth", "Ticks waiting for classification.")
+TICKS_DROPPED = Counter("capture_ticks_dropped_total", "Ticks dropped because the queue was full.")
+SAMPLE_RATE = SampleRate()
+SAMPLES_PER_MINUTE = Gauge("capture_samples_per_minute", "Result rows written over the last minute.")
+SAMPLES_PER_MINUTE.set_function(SAMPLE_RATE.per_minute)
+
+
+def _failed(result):
+    return result is None or isinstance(result, str) and result == "failed"
+
+
+def timed(stage):
+    """Decorator: record the call's latency under `stage`, and count exceptions, None and "failed" results."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                STAGE_FAILURES.inc(stage=stage)
+                raise
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+            if _failed(result):
+                STAGE_FAILURES.inc(stage=stage)
+            return result
+        return wrapper
+    return decorator
+
+
+def record_row():
+    """Count one written result row towards the total and the samples/min rate."""
+    ROWS_WRITTEN.inc()
+    SAMPLE_RATE.mark()
+
+
+class TickLog:
+    """Optional JSON-lines log with the latest latency of every stage at each written row."""
+
+    def __init__(self, path):
+        self._file = open(path, "a", buffering=1)
+        self._lock = threading.Lock()
+
+    def write(self, timestamp, **fields):
+        with STAGE_SECONDS._lock:
+            stages = {key[0]: round(seconds, 6) for key, seconds in STAGE_SECONDS.last.items()}
+        line = json.dumps(dict(fields, t=round(timestamp, 3), stages=stages))
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """GET /metrics returns every registered metric in Prometheus text format."""
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port=9108, host="127.0.0.1"):
+    """Serve /metrics on a daemon thread and return the HTTP server, or None if the port is taken."""
+    try:
+        httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        print(f"Warning: metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    threading.Thread(target=httpd.serve_forever, name="metrics", daemon=True).start()
+    return httpd
@@ -0,0 +1,277 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Policies applied when a bounded queue is full
+DROP_OLDEST = "drop_oldest"  # discard the stalest pending tick, keep the fresh one
+DROP_NEWEST = "drop_newest"  # discard the tick that was just captured
+BLOCK = "block"              # stall the producer until a worker frees a slot
+
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class StageStats:
+    """Thread-safe latency counters for a single pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.last = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    @contextmanager
+    def timed(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            mean = self.total / self.count if self.count else 0.0
+            return {"count": self.count, "mean": mean, "max": self.max, "last": self.last}
+
+
+def put_with_policy(q, item, policy=DROP_OLDEST, on_drop=None):
+    """Put an item on a bounded queue, applying the drop policy when it is full.
+
+    `on_drop` is called with every item that is discarded. Returns the number
+    of items that were dropped.
+    """
+    if policy == BLOCK:
+        q.put(item)
+        return 0
+
+    dropped = 0
+    while True:
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            if policy == DROP_NEWEST:
+                if on_drop:
+                    on_drop(item)
+                return dropped + 1
+            try:
+                discarded = q.get_nowait()
+                dropped += 1
+                if on_drop:
+                    on_drop(discarded)
+            except queue.Empty:
+                pass
+
+
+def _failed(label):
+    return label is None or isinstance(label, str) and label == "failed"
+
+
+class _Reference:
+    """The result of one payload that passed a gate, for the ticks the gate reuses it in.
+
+    If that payload fails, or its tick is dropped before it is classified, the
+    reusing ticks fall back to the reference before it.
+    """
+
+    def __init__(self, previous):
+        self.previous = previous
+        self.future = Future()
+
+    def resolve(self, label):
+        if self.future.done():
+            return
+        if not _failed(label):
+            self.previous = None  # nothing further back is needed, so the chain does not grow with every tick
+        self.future.set_result(label)
+
+    def value(self):
+        reference = self
+        while reference is not None:
+            label = reference.future.result()
+            if not _failed(label):
+                return label
+            reference = reference.previous
+        return None
+
+
+class CapturePipeline:
+    """Capture producer feeding a bounded tick queue drained by classifier workers.
+
+    Each tick grabs an image and an audio window concurrently. Workers classify
+    the two modalities of a tick in parallel while the producer is already
+    recording the next window, so the capture cadence does not depend on
+    inference latency.
+
+    Optional gates (objects with `should_classify(payload)`) run on the
+    producer; a gated-out payload is not classified and the row reuses the
+    label of the payload the gate compared it against, flagged as reused.
+    Ticks finish out of order with several workers, so the reused label is
+    taken from that payload's own result rather than the latest one.
+    """
+
+    def __init__(self, capture_image, capture_audio, classify_image, classify_audio, write_row,
+                 interval=None, queue_size=4, workers=2, drop_policy=DROP_OLDEST,
+                 image_gate=None, audio_gate=None):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+
+        self.capture_image = capture_image
+        self.capture_audio = capture_audio
+        self.classify_image = classify_image
+        self.classify_audio = classify_audio
+        self.write_row = write_row
+        self.interval = interval
+        self.drop_policy = drop_policy
+        self.num_workers = workers
+        self.image_gate = image_gate
+        self.audio_gate = audio_gate
+        self._references = {"image": None, "audio": None}  # producer-side only
+
+        self.ticks = queue.Queue(maxsize=queue_size)
+        self.stats = {
+            name: StageStats(name)
+            for name in ("capture_image", "capture_audio", "classify_image",
+                         "classify_audio", "write", "end_to_end")
+        }
+        self.captured = 0
+        self.dropped = 0
+
+        self._stop = threading.Event()
+        self._write_lock = threading.Lock()
+        self._threads = []
+        # One extra thread grabs the frame while the producer records audio
+        self._capture_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture")
+        # Two slots per worker so image and audio of one tick run side by side
+        self._classify_pool = ThreadPoolExecutor(max_workers=2 * workers, thread_name_prefix="classify")
+
+    def _timed(self, stage, fn, *args):
+        with self.stats[stage].timed():
+            return fn(*args)
+
+    def _capture_loop(self):
+        start = time.monotonic()
+        next_tick = start
+        while not self._stop.is_set():
+            image_future = self._capture_pool.submit(self._timed, "capture_image", self.capture_image)
+            audio = self._timed("capture_audio", self.capture_audio)
+            image = image_future.result()
+
+            now = time.monotonic()
+            tick = {"timestamp": now - start, "captured_at": now, "image": image, "audio": audio,
+                    "image_reused": False, "audio_reused": False, "image_ref": None, "audio_ref": None}
+            for modality, gate in (("image", self.image_gate), ("audio", self.audio_gate)):
+                if tick[modality] is None:
+                    continue
+                if gate and not gate.should_classify(tick[modality]):
+                    tick[modality], tick[f"{modality}_reused"] = None, True
+                    tick[f"{modality}_ref"] = self._references[modality]
+                else:
+                    reference = self._references[modality] = _Reference(self._references[modality])
+                    tick[f"{modality}_ref"] = reference
+            self.captured += 1
+            self.dropped += put_with_policy(self.ticks, tick, self.drop_policy, on_drop=self._dropped)
+
+            if self.interval:
+                # Keep a fixed cadence; skip deadlines we already missed instead of bursting
+                next_tick += self.interval
+                if next_tick < now:
+                    next_tick = now + self.interval - ((now - next_tick) % self.interval)
+                self._stop.wait(max(0.0, next_tick - time.monotonic()))
+
+    def _classify_loop(self):
+        while True:
+            tick = self.ticks.get()
+            if tick is None:
+                break
+
+            image_future = None
+            audio_future = None
+            if tick["image"] is not None:
+                image_future = self._classify_pool.submit(
+                    self._timed, "classify_image", self.classify_image, tick["image"])
+            if tick["audio"] is not None:
+                audio_future = self._classify_pool.submit(
+                    self._timed, "classify_audio", self.classify_audio, tick["audio"])
+
+            results = {}
+            for modality, future in (("image", image_future), ("audio", audio_future)):
+                reference, reused = tick[f"{modality}_ref"], tick[f"{modality}_reused"]
+                try:
+                    results[modality] = self._resolve(future, reference, reused)
+                except Exception as e:
+                    print(f"Failed to resolve the {modality} result at {tick['timestamp']:.1f}s: {e}")
+                    results[modality] = "failed"
+                    # Ticks reusing this payload must not wait forever on its reference
+                    if not reused and reference is not None:
+                        reference.resolve("failed")
+
+            try:
+                with self._write_lock, self.stats["write"].timed():
+                    self.write_row(tick["timestamp"], results["image"], results["audio"],
+                                   tick["image_reused"], tick["audio_reused"])
+            except Exception as e:
+                print(f"Failed to write row at {tick['timestamp']:.1f}s: {e}")
+            self.stats["end_to_end"].record(time.monotonic() - tick["captured_at"])
+
+    def _resolve(self, future, reference, reused):
+        if reused:
+            return reference.value() if reference is not None else None
+        if future is None:
+            return None
+        try:
+            label = future.result()
+        except Exception as e:
+            print(f"Classification failed: {e}")
+            label = "failed"
+        reference.resolve(label)
+        return label
+
+    def _dropped(self, tick):
+        # Ticks reusing this tick's payloads fall back to the reference before it
+        for modality in ("image", "audio"):
+            if not tick[f"{modality}_reused"] and tick[f"{modality}_ref"] is not None:
+                tick[f"{modality}_ref"].resolve(None)
+
+    def start(self):
+        producer = threading.Thread(target=self._capture_loop, name="capture-producer", daemon=True)
+        self._threads.append(producer)
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._classify_loop, name=f"classify-worker-{i}", daemon=True)
+            self._threads.append(worker)
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stop capturing, let workers finish queued ticks, then shut down the pools."""
+        self._stop.set()
+        self._threads[0].join()
+        for _ in range(self.num_workers):
+            self.ticks.put(None)
+        for thread in self._threads[1:]:
+            thread.join()
+        self._capture_pool.shutdown()
+        self._classify_pool.shutdown()
+
+    def report(self):
+        """Print per-stage latency counters and queue state."""
+        print(f"captured={self.captured} dropped={self.dropped} queued={self.ticks.qsize()}")
+        if self.image_gate:
+            print(f"  image gate: classified={self.image_gate.passed} reused={self.image_gate.reused}")
+        if self.audio_gate:
+            print(f"  audio gate: classified={self.audio_gate.passed} silent={self.audio_gate.skipped}")
+        for name, stats in self.stats.items():
+            snap = stats.snapshot()
+            print(f"  {name:<15} n={snap['count']:<6} mean={snap['mean']:.3f}s "
+                  f"max={snap['max']:.3f}s last={snap['last']:.3f}s")
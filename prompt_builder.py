@@ -0,0 +1,145 @@
+import numpy as np
+
+from emotion_labels import is_result, normalize_label, run_length_spans
+
+DEFAULT_TOKEN_BUDGET = 6000
+
+# Bump whenever the prompt wording or summary format changes so cached analyses are not reused
+PROMPT_VERSION = 1
+
+# Progressively coarser detail levels: max segments listed per modality (None = all)
+SEGMENT_LIMITS = [None, 24, 12, 6, 3, 0]
+
+PROMPT_HEADER = (
+    "You are given emotion data for a particular child, classified from images (facial expression) "
+    "and audio (voice). Each session lasts no longer than 45 minutes and is summarised below: "
+    "duration, number of samples, how often the image and audio emotions agree, the share of time "
+    "spent in each emotion, the number of emotion changes, and the emotion segments in time order "
+    "as `emotion start-end` (MM:SS). "
+    "You have to analyze each session separately. "
+    "Give inference of the child's emotion and a comprehensive emotional profile for this child aesthetically, "
+    "so that a doctor can use it. The data starts from here:\n"
+)
+
+_encoding = None
+
+
+def count_tokens(text):
+    """Count tokens with tiktoken when it is installed, otherwise estimate about 4 characters per token."""
+    global _encoding
+    try:
+        import tiktoken
+    except ImportError:
+        return len(text) // 4 + 1
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return len(_encoding.encode(text))
+
+
+def _mm_ss(seconds):
+    return f"{int(seconds // 60)}:{int(seconds % 60):02d}"
+
+
+def summarize_session(session_df):
+    """Compress one session's rows into run-length segments plus summary statistics."""
+    session_df = session_df.sort_values("timestamp")
+    times = session_df["timestamp"].to_numpy(dtype=float)
+    summary = {
+        "session_id": str(session_df["session_id"].iloc[0]),
+        "duration": float(times[-1] - times[0]) if len(times) else 0.0,
+        "samples": len(times),
+    }
+
+    image = session_df["image_result"].astype(object).map(normalize_label).to_numpy(dtype=object)
+    audio = session_df["audio_result"].astype(object).map(normalize_label).to_numpy(dtype=object)
+    # Failed and missing classifications are left out of agreement, dwell and changes
+    image_valid = np.fromiter(map(is_result, image), dtype=bool, count=len(image))
+    audio_valid = np.fromiter(map(is_result, audio), dtype=bool, count=len(audio))
+    both = image_valid & audio_valid
+    summary["agreement"] = float(np.mean(image[both] == audio[both])) if both.any() else 0.0
+
+    for name, labels, valid in (("image", image, image_valid), ("audio", audio, audio_valid)):
+        spans = run_length_spans(times[valid], labels[valid])
+        dwell = {}
+        for emotion, _, width in spans:
+            dwell[emotion] = dwell.get(emotion, 0.0) + width
+        summary[f"{name}_segments"] = spans
+        summary[f"{name}_dwell"] = dwell
+        summary[f"{name}_changes"] = max(0, len(spans) - 1)
+    return summary
+
+
+def _dwell_text(dwell, duration):
+    if duration <= 0:
+        return ", ".join(str(emotion) for emotion in dwell)
+    ranked = sorted(dwell.items(), key=lambda item: item[1], reverse=True)
+    return ", ".join(f"{emotion} {100 * seconds / duration:.0f}%" for emotion, seconds in ranked)
+
+
+def _segments_text(spans, limit):
+    if limit is not None and len(spans) > limit:
+        # Keep the longest segments, still listed in time order
+        keep = sorted(sorted(range(len(spans)), key=lambda i: spans[i][2], reverse=True)[:limit])
+        suffix = f" ({limit} longest of {len(spans)} shown)"
+        spans = [spans[i] for i in keep]
+    else:
+        suffix = ""
+    return ", ".join(f"{emotion} {_mm_ss(start)}-{_mm_ss(start + width)}" for emotion, start, width in spans) + suffix
+
+
+def format_session(summary, segment_limit=None):
+    lines = [
+        f"Session {summary['session_id'][:8]}: {summary['duration'] / 60:.1f} min, {summary['samples']} samples, "
+        f"image/audio agreement {100 * summary['agreement']:.0f}%",
+        f"  image time share: {_dwell_text(summary['image_dwell'], summary['duration'])}; "
+        f"{summary['image_changes']} changes",
+        f"  audio time share: {_dwell_text(summary['audio_dwell'], summary['duration'])}; "
+        f"{summary['audio_changes']} changes",
+    ]
+    # Summaries read from the session summary index carry no segment lists
+    if segment_limit != 0 and (summary["image_segments"] or summary["audio_segments"]):
+        lines.append(f"  image segments: {_segments_text(summary['image_segments'], segment_limit)}")
+        lines.append(f"  audio segments: {_segments_text(summary['audio_segments'], segment_limit)}")
+    return "\n".join(lines)
+
+
+def summarize_sessions(df):
+    return [summarize_session(session_df) for _, session_df in df.groupby("session_id", observed=True, sort=False)]
+
+
+def build_prompt(df, token_budget=DEFAULT_TOKEN_BUDGET, tokenizer=count_tokens, header=PROMPT_HEADER):
+    """Compile the analysis prompt and fit it to `token_budget` tokens.
+
+    Detail is reduced in steps (fewer listed segments per session) until the
+    prompt fits; if even the statistics alone are too long, the shortest
+    sessions are left out. Returns (prompt, info).
+    """
+    summaries = summarize_sessions(df)
+    return fit_summaries(summaries, token_budget=token_budget, tokenizer=tokenizer, header=header)
+
+
+def fit_summaries(summaries, token_budget=DEFAULT_TOKEN_BUDGET, tokenizer=count_tokens, header=PROMPT_HEADER):
+    """Fit already summarised sessions into the token budget. See build_prompt."""
+    for limit in SEGMENT_LIMITS:
+        prompt = header + "\n\n".join(format_session(summary, limit) for summary in summaries)
+        tokens = tokenizer(prompt)
+        if tokens <= token_budget:
+            return prompt, {"tokens": tokens, "segment_limit": limit,
+                            "sessions": len(summaries), "omitted_sessions": 0}
+
+    # Statistics alone don't fit: keep as many of the longest sessions as the budget allows
+    blocks = [(summary["duration"], format_session(summary, 0)) for summary in summaries]
+    blocks.sort(key=lambda item: item[0], reverse=True)
+    kept = []
+    used = tokenizer(header)
+    for _, block in blocks:
+        cost = tokenizer(block + "\n\n")
+        if used + cost > token_budget:
+            break
+        kept.append(block)
+        used += cost
+    omitted = len(blocks) - len(kept)
+    note = f"\n\n({omitted} shorter sessions omitted to fit the context window.)" if omitted else ""
+    prompt = header + "\n\n".join(kept) + note
+    return prompt, {"tokens": tokenizer(prompt), "segment_limit": 0,
+                    "sessions": len(kept), "omitted_sessions": omitted}
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import visualizer
+
+MANIFEST_NAME = "report_manifest.json"
+# Manifest entry remembering which sessions `recent_sessions` picked for the current source
+RECENT_SESSIONS_KEY = "recent_sessions"
+
+# Output presets: quick previews while iterating, print quality for the final report
+PRESETS = {
+    "preview": {"dpi": 72, "fmt": "png"},
+    "print": {"dpi": 300, "fmt": "png"},
+    "vector": {"dpi": 300, "fmt": "pdf"},
+}
+
+# Whole-archive figures and the columns each one depends on
+FIGURES = {
+    "emotion_distribution": ("visualize_emotion_distribution", ["image_result", "audio_result"]),
+    "emotion_correlation": ("visualize_emotion_correlation", ["image_result", "audio_result"]),
+    "emotion_transitions": ("visualize_emotion_transitions",
+                            ["session_id", "timestamp", "image_result", "audio_result"]),
+    "session_statistics": ("visualize_session_statistics", ["session_id", "timestamp"]),
+}
+
+
+def fingerprint_source(file_path, columns, settings):
+    """Hash of the results file's identity (path, size, mtime) plus the columns and render settings.
+
+    Checking it costs a stat instead of a pass over the archive. A SQLite
+    database's WAL file is included, since new rows land there first.
+    """
+    parts = [os.path.abspath(file_path), list(columns), settings]
+    for name in (file_path, file_path + "-wal"):
+        if os.path.exists(name):
+            stat = os.stat(name)
+            parts.append([stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def fingerprint_timeline(task):
+    session_id, times, image_labels, audio_labels, image_colors, audio_colors, _, dpi, fmt = task
+    digest = hashlib.sha256(json.dumps([session_id, dpi, fmt, list(map(str, image_colors)),
+                                        list(map(str, audio_colors))]).encode())
+    digest.update(np.asarray(times, dtype=float).tobytes())
+    digest.update("\0".join(map(str, image_labels)).encode())
+    digest.update("\0".join(map(str, audio_labels)).encode())
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _render_figure(function_name, df, output_dir, dpi, fmt):
+    return getattr(visualizer, function_name)(df, output_dir=output_dir, dpi=dpi, fmt=fmt)
+
+
+def _is_current(manifest, key, fingerprint):
+    entry = manifest.get(key)
+    return entry is not None and entry["fingerprint"] == fingerprint and os.path.exists(entry["file"])
+
+
+def build_report(file_path, output_dir=".", dpi=300, fmt="png", workers=None,
+                 timeline_sessions=None, recent_sessions=None, force=False):
+    """Render every figure whose inputs changed since the last run, in parallel worker processes.
+
+    Whole-archive figures are fingerprinted on the results file's stat, so an
+    unchanged archive is not even loaded when the requested timelines are
+    current too. Each session timeline is fingerprinted on that session's
+    rows, so after new rows arrive only the sessions they touched are redrawn.
+    `timeline_sessions` limits timelines to the given ids; `recent_sessions`
+    instead picks the last N sessions appended, a choice kept in the manifest
+    so an unchanged archive is not read to repeat it.
+    Returns (rendered, skipped) lists of manifest keys.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {} if force else load_manifest(output_dir)
+    settings = {"dpi": dpi, "fmt": fmt}
+    source = fingerprint_source(file_path, [], settings)
+    figure_fingerprints = {key: fingerprint_source(file_path, columns, settings)
+                           for key, (_, columns) in FIGURES.items()}
+
+    recent = manifest.get(RECENT_SESSIONS_KEY, {})
+    if (timeline_sessions is None and recent_sessions
+            and recent.get("source") == source and recent.get("count") == recent_sessions):
+        timeline_sessions = recent["sessions"]
+
+    if (timeline_sessions is not None
+            and all(_is_current(manifest, key, fingerprint) for key, fingerprint in figure_fingerprints.items())
+            and all(manifest.get(f"session_timeline:{session_id}", {}).get("source") == source
+                    and os.path.exists(manifest[f"session_timeline:{session_id}"]["file"])
+                    for session_id in timeline_sessions)):
+        skipped = list(figure_fingerprints) + [f"session_timeline:{session_id}" for session_id in timeline_sessions]
+        print(f"{file_path} is unchanged; all {len(skipped)} figures are up to date")
+        return [], skipped
+
+    df = visualizer.load_data(file_path)
+    print(f"Loaded {len(df)} data points from {df['session_id'].nunique()} sessions")
+    if timeline_sessions is None and recent_sessions:
+        timeline_sessions = sorted(df["session_id"].astype(object)[::-1].unique()[:recent_sessions])
+        manifest[RECENT_SESSIONS_KEY] = {"source": source, "count": recent_sessions,
+                                         "sessions": list(timeline_sessions)}
+    jobs = {}
+    skipped = []
+
+    for key, (function_name, columns) in FIGURES.items():
+        fingerprint = figure_fingerprints[key]
+        if _is_current(manifest, key, fingerprint):
+            skipped.append(key)
+        else:
+            jobs[key] = (fingerprint, _render_figure, (function_name, df[columns], output_dir, dpi, fmt))
+
+    for task in visualizer.session_timeline_tasks(df, timeline_sessions, output_dir=output_dir, dpi=dpi, fmt=fmt):
+        key = f"session_timeline:{task[0]}"
+        fingerprint = fingerprint_timeline(task)
+        if _is_current(manifest, key, fingerprint):
+            manifest[key]["source"] = source
+            skipped.append(key)
+        else:
+            jobs[key] = (fingerprint, visualizer.render_session_timeline_task, (task,))
+
+    print(f"{len(jobs)} figures to render, {len(skipped)} unchanged")
+    rendered = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=visualizer.use_agg_backend) as pool:
+        futures = {key: pool.submit(fn, *args) for key, (_, fn, args) in jobs.items()}
+        for key, future in futures.items():
+            try:
+                output_file = future.result()
+            except Exception as e:
+                print(f"Failed to render {key}: {e}")
+                continue
+            manifest[key] = {"fingerprint": jobs[key][0], "file": output_file}
+            if key.startswith("session_timeline:"):
+                manifest[key]["source"] = source
+            rendered.append(key)
+
+    save_manifest(output_dir, manifest)
+    return rendered, skipped
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_PATH = "inference_cache.sqlite"
+
+
+def cache_key(model_id, data):
+    """Content address for an input: SHA-256 over the model id and the raw bytes."""
+    digest = hashlib.sha256()
+    digest.update(model_id.encode())
+    digest.update(b"\0")
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Two-tier cache of model outputs: an in-process LRU in front of a size-bounded SQLite file.
+
+    Values must be JSON-serialisable. The disk tier evicts least recently used
+    entries once it grows past `max_disk_bytes`. With `ttl` (seconds) set,
+    entries older than that are treated as missing and dropped on lookup.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, memory_entries=1024, max_disk_bytes=256 * 1024 * 1024, ttl=None):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_bytes = 0
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, model_id TEXT, value TEXT, size INTEGER, accessed REAL, created REAL)")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(results)")}
+            if "created" not in columns:
+                # Cache files written before TTL support
+                self._conn.execute("ALTER TABLE results ADD COLUMN created REAL")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def get(self, model_id, data):
+        """Return the cached output for these input bytes, or None."""
+        key = cache_key(model_id, data)
+        with self._lock:
+            if key in self._memory:
+                value, created = self._memory[key]
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return value
+                self._drop(key)
+
+            if self._conn is not None:
+                row = self._conn.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None and self._expired(row[1]):
+                    self._drop(key)
+                    self._conn.commit()
+                elif row is not None:
+                    self._conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+                    self._conn.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, model_id, data, value):
+        key = cache_key(model_id, data)
+        encoded = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._conn is None:
+                return
+            previous = self._conn.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, model_id, value, size, accessed, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_id, encoded, len(encoded), now, now))
+            self._disk_bytes += len(encoded) - (previous[0] if previous else 0)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+            self._conn.commit()
+
+    def _expired(self, created):
+        # Rows from before TTL support have no creation time and count as stale
+        return self.ttl is not None and (created is None or time.time() - created > self.ttl)
+
+    def _drop(self, key):
+        self._memory.pop(key, None)
+        self.expirations += 1
+        if self._conn is not None:
+            row = self._conn.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._disk_bytes -= row[0]
+
+    def _remember(self, key, value, created):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        # Trim to 90% of the budget so we don't evict on every subsequent put
+        target = int(self.max_disk_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, size FROM results ORDER BY accessed").fetchall()
+        for key, size in rows:
+            if self._disk_bytes <= target:
+                break
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            self._disk_bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,476 @@
+import csv
+import os
+import queue
+import sqlite3
+import threading
+import time
+from array import array
+
+import metrics
+
+# Columns of a result row; the *_reused flags mark labels carried over by the change gates
+# and fused_result is the late-fusion emotion across both modalities
+RESULT_COLUMNS = ["session_id", "timestamp", "image_result", "audio_result", "image_reused", "audio_reused",
+                  "fused_result"]
+LABEL_COLUMNS = ["image_result", "audio_result", "fused_result"]
+# Optional full score vectors over emotion_labels.EMOTIONS (float32), kept by the SQLite and Parquet
+# sinks so consumers can rebuild a dense score matrix; CSV files keep the label-only schema
+SCORE_COLUMNS = ["image_scores", "audio_scores"]
+
+
+def _pack_scores(vector):
+    return None if vector is None or isinstance(vector, str) else array("f", vector).tobytes()
+
+
+def _unpack_scores(blob):
+    import numpy as np
+
+    return None if blob is None else np.frombuffer(blob, dtype=np.float32)
+
+
+class ResultsSink:
+    """Destination for result rows, given as dicts keyed by RESULT_COLUMNS."""
+
+    def write(self, row):
+        raise NotImplementedError
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvSink(ResultsSink):
+    """Append rows to a CSV file kept open for the life of the sink.
+
+    An existing file keeps its header; columns it does not have are dropped.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, newline='') as file:
+                self.columns = next(csv.reader(file))
+        else:
+            self.columns = RESULT_COLUMNS
+        self._file = open(path, mode='a', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.columns, extrasaction='ignore')
+        if not exists:
+            self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(row)
+
+    def write_many(self, rows):
+        self._writer.writerows(rows)
+
+    def flush(self):
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+class SQLiteSink(ResultsSink):
+    """Store rows in SQLite (WAL mode) with session ids and labels dictionary-encoded as integers."""
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL only syncs at checkpoints in WAL mode; FULL syncs every commit
+        self._conn.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        create_sqlite_schema(self._conn)
+        self._sessions = dict(self._conn.execute("SELECT session_id, id FROM sessions"))
+        self._labels = dict(self._conn.execute("SELECT label, id FROM labels"))
+        self._lock = threading.Lock()
+
+    def _code(self, table, column, cache, value):
+        if value is None:
+            return None
+        code = cache.get(value)
+        if code is None:
+            cursor = self._conn.execute(f"INSERT INTO {table} ({column}) VALUES (?)", (value,))
+            code = cache[value] = cursor.lastrowid
+        return code
+
+    def write(self, row):
+        self.write_many([row])
+
+    def write_many(self, rows):
+        with self._lock:
+            records = [
+                (self._code("sessions", "session_id", self._sessions, str(row["session_id"])),
+                 float(row["timestamp"]),
+                 self._code("labels", "label", self._labels, row.get("image_result")),
+                 self._code("labels", "label", self._labels, row.get("audio_result")),
+                 int(bool(row.get("image_reused"))),
+                 int(bool(row.get("audio_reused"))),
+                 self._code("labels", "label", self._labels, row.get("fused_result")),
+                 _pack_scores(row.get("image_scores")),
+                 _pack_scores(row.get("audio_scores")))
+                for row in rows
+            ]
+            self._conn.executemany(
+                "INSERT INTO results (session, timestamp, image_result, audio_result, image_reused, audio_reused, "
+                "fused_result, image_scores, audio_scores) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", records)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def create_sqlite_schema(conn):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY, session_id TEXT UNIQUE NOT NULL);
+        CREATE TABLE IF NOT EXISTS labels (id INTEGER PRIMARY KEY, label TEXT UNIQUE NOT NULL);
+        CREATE TABLE IF NOT EXISTS results (
+            session INTEGER NOT NULL REFERENCES sessions (id),
+            timestamp REAL NOT NULL,
+            image_result INTEGER REFERENCES labels (id),
+            audio_result INTEGER REFERENCES labels (id),
+            image_reused INTEGER NOT NULL DEFAULT 0,
+            audio_reused INTEGER NOT NULL DEFAULT 0,
+            fused_result INTEGER REFERENCES labels (id),
+            image_scores BLOB,
+            audio_scores BLOB
+        );
+        CREATE INDEX IF NOT EXISTS results_session_time ON results (session, timestamp);
+    """)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+    if "fused_result" not in columns:
+        # Databases created before late fusion was added
+        conn.execute("ALTER TABLE results ADD COLUMN fused_result INTEGER REFERENCES labels (id)")
+    for name in SCORE_COLUMNS:
+        if name not in columns:
+            # Databases created before score vectors were stored
+            conn.execute(f"ALTER TABLE results ADD COLUMN {name} BLOB")
+
+
+class ParquetSink(ResultsSink):
+    """Write each flushed batch as a Parquet row group with dictionary-encoded strings.
+
+    A Parquet file cannot be appended to once closed, so an existing file is
+    never reopened: every run needs a new path.
+    """
+
+    def __init__(self, path, fsync=False):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self.path = path
+        self.fsync = fsync
+        self.schema = pa.schema([
+            ("session_id", pa.dictionary(pa.int32(), pa.string())),
+            ("timestamp", pa.float64()),
+            ("image_result", pa.dictionary(pa.int8(), pa.string())),
+            ("audio_result", pa.dictionary(pa.int8(), pa.string())),
+            ("image_reused", pa.bool_()),
+            ("audio_reused", pa.bool_()),
+            ("fused_result", pa.dictionary(pa.int8(), pa.string())),
+            ("image_scores", pa.list_(pa.float32())),
+            ("audio_scores", pa.list_(pa.float32())),
+        ])
+        try:
+            self._file = open(path, "xb")
+        except FileExistsError:
+            raise FileExistsError(f"{path} already exists; Parquet results cannot be appended to, "
+                                  "so choose a new file for this run") from None
+        self._writer = pq.ParquetWriter(self._file, self.schema)
+        self._pending = []
+
+    def write(self, row):
+        self._pending.append(row)
+
+    def flush(self):
+        if not self._pending or self._writer is None:
+            return
+        columns = {name: [row.get(name) for row in self._pending] for name in RESULT_COLUMNS}
+        for name in SCORE_COLUMNS:
+            columns[name] = [None if row.get(name) is None or isinstance(row.get(name), str)
+                             else [float(value) for value in row[name]] for row in self._pending]
+        columns["session_id"] = [str(value) for value in columns["session_id"]]
+        columns["image_reused"] = [bool(value) for value in columns["image_reused"]]
+        columns["audio_reused"] = [bool(value) for value in columns["audio_reused"]]
+        table = self._pa.Table.from_pydict(columns, schema=self.schema)
+        self._writer.write_table(table)
+        self._pending = []
+        if self.fsync:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            # The Parquet footer is written here; the file is unreadable until then
+            self._writer.close()
+            self._writer = None
+        if not self._file.closed:
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._file.close()
+
+
+class BatchedSink(ResultsSink):
+    """Hand rows to a background thread that writes them to another sink in batches.
+
+    `write` only enqueues, so the capture loop never waits on disk. The
+    batch is written when it reaches `max_rows` rows or `max_interval`
+    seconds after its first row, whichever comes first.
+    """
+
+    def __init__(self, sink, max_rows=50, max_interval=5.0):
+        self.sink = sink
+        self.max_rows = max_rows
+        self.max_interval = max_interval
+        self.written = 0
+        self._rows = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="results-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, row):
+        self._rows.put(row)
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                row = self._rows.get(timeout=timeout)
+            except queue.Empty:
+                row = _FLUSH
+
+            if row is _CLOSE or row is _FLUSH:
+                self._write_batch(batch)
+                batch, deadline = [], None
+                if row is _CLOSE:
+                    return
+                continue
+
+            batch.append(row)
+            if deadline is None:
+                deadline = time.monotonic() + self.max_interval
+            if len(batch) >= self.max_rows:
+                self._write_batch(batch)
+                batch, deadline = [], None
+
+    def _write_batch(self, batch):
+        if not batch:
+            return
+        try:
+            with metrics.STAGE_SECONDS.time(stage="write_batch"):
+                self.sink.write_many(batch)
+                self.sink.flush()
+            self.written += len(batch)
+        except Exception as e:
+            metrics.STAGE_FAILURES.inc(stage="write_batch")
+            print(f"Failed to write {len(batch)} result rows: {e}")
+
+    def flush(self):
+        """Ask the writer thread to write whatever it has buffered."""
+        self._rows.put(_FLUSH)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._rows.put(_CLOSE)
+            self._thread.join()
+        self.sink.close()
+
+
+_FLUSH = object()
+_CLOSE = object()
+
+
+class TeeSink(ResultsSink):
+    """Write every row to several sinks, e.g. the results file and the session summary index."""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def write(self, row):
+        for sink in self.sinks:
+            sink.write(row)
+
+    def write_many(self, rows):
+        for sink in self.sinks:
+            sink.write_many(rows)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def open_sink(path, batched=True, max_rows=50, max_interval=5.0, fsync=False, summary_path=None):
+    """Open the sink matching the file extension (.csv, .sqlite/.db, .parquet).
+
+    With `summary_path`, every batch also updates the per-session summary index there.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".sqlite", ".db"):
+        sink = SQLiteSink(path, fsync=fsync)
+    elif extension == ".parquet":
+        sink = ParquetSink(path, fsync=fsync)
+    else:
+        sink = CsvSink(path, fsync=fsync)
+    if summary_path:
+        from session_summary import SummarySink
+
+        sink = TeeSink(sink, SummarySink(summary_path))
+    if batched:
+        sink = BatchedSink(sink, max_rows=max_rows, max_interval=max_interval)
+    return sink
+
+
+def read_results(path, columns=None, sessions=None):
+    """Load results from any sink format, reading only the requested columns and sessions.
+
+    `path` may also be an open CSV file object (e.g. a Streamlit upload).
+    session_id and the emotion columns come back as pandas categoricals.
+    SCORE_COLUMNS are only returned when asked for, as float32 arrays (None
+    where not stored); CSV files have none.
+    """
+    import pandas as pd
+
+    wanted = list(columns) if columns else list(RESULT_COLUMNS)
+    # Filtering by session needs the session column even if the caller didn't ask for it
+    needed = wanted + (["session_id"] if sessions is not None and "session_id" not in wanted else [])
+    name = path if isinstance(path, (str, os.PathLike)) else getattr(path, "name", "")
+    extension = os.path.splitext(name)[1].lower()
+
+    if extension in (".sqlite", ".db"):
+        df = _read_sqlite(path, needed, sessions)
+    elif extension == ".parquet":
+        import pyarrow.parquet as pq
+
+        # Files written before score vectors were stored don't have those columns
+        available = set(pq.read_schema(path).names)
+        filters = [("session_id", "in", list(sessions))] if sessions is not None else None
+        df = pd.read_parquet(path, columns=[name for name in needed if name in available], filters=filters)
+    else:
+        dtypes = {name: "category" for name in ["session_id"] + LABEL_COLUMNS}
+        df = pd.read_csv(path, usecols=lambda name: name in needed, dtype=dtypes)
+        if sessions is not None:
+            df = df[df["session_id"].isin(list(sessions))]
+
+    for name in ["session_id"] + LABEL_COLUMNS:
+        if name in df.columns and df[name].dtype.name != "category":
+            df[name] = df[name].astype("category")
+    if sessions is not None and "session_id" in df.columns:
+        df["session_id"] = df["session_id"].cat.remove_unused_categories()
+    return df[[name for name in wanted if name in df.columns]].reset_index(drop=True)
+
+
+_SQLITE_SELECT = {
+        "session_id": "s.session_id AS session_id",
+        "timestamp": "r.timestamp AS timestamp",
+        "image_result": "li.label AS image_result",
+        "audio_result": "la.label AS audio_result",
+        "image_reused": "r.image_reused AS image_reused",
+        "audio_reused": "r.audio_reused AS audio_reused",
+        "fused_result": "lf.label AS fused_result",
+        "image_scores": "r.image_scores AS image_scores",
+        "audio_scores": "r.audio_scores AS audio_scores",
+}
+
+
+def _sqlite_query(columns):
+    """SELECT of `columns` from the dictionary-encoded schema, with the joins back to strings."""
+    return (f"SELECT {', '.join(_SQLITE_SELECT[name] for name in columns)} FROM results r "
+            "JOIN sessions s ON s.id = r.session "
+            "LEFT JOIN labels li ON li.id = r.image_result "
+            "LEFT JOIN labels la ON la.id = r.audio_result "
+            "LEFT JOIN labels lf ON lf.id = r.fused_result")
+
+
+def _unpack_score_columns(df):
+    for name in SCORE_COLUMNS:
+        if name in df.columns:
+            df[name] = df[name].map(_unpack_scores)
+    return df
+
+
+def _read_sqlite(path, columns, sessions):
+    import pandas as pd
+
+    query = _sqlite_query(columns)
+    params = []
+    if sessions is not None:
+        sessions = list(sessions)
+        if not sessions:
+            return pd.DataFrame(columns=list(columns))
+        query += f" WHERE s.session_id IN ({', '.join('?' * len(sessions))})"
+        params = sessions
+    query += " ORDER BY r.rowid"
+    conn = sqlite3.connect(path)
+    try:
+        df = pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+    return _unpack_score_columns(df)
+
+
+def iter_sqlite_chunks(path, columns, chunksize=500_000, sessions=None, start=None, end=None):
+    """Yield DataFrames of at most `chunksize` rows from a SQLiteSink database in insertion order.
+
+    Pages by rowid rather than OFFSET, so each page is an index range scan
+    however deep into the table it is; the filters run in SQLite.
+    """
+    import pandas as pd
+
+    conditions = ["r.rowid > ?"]
+    filters = []
+    if sessions is not None:
+        sessions = list(sessions)
+        if not sessions:
+            return
+        conditions.append(f"s.session_id IN ({', '.join('?' * len(sessions))})")
+        filters += sessions
+    if start is not None:
+        conditions.append("r.timestamp >= ?")
+        filters.append(start)
+    if end is not None:
+        conditions.append("r.timestamp <= ?")
+        filters.append(end)
+    query = (_sqlite_query(columns).replace("SELECT ", "SELECT r.rowid AS _rowid, ", 1)
+             + f" WHERE {' AND '.join(conditions)} ORDER BY r.rowid LIMIT ?")
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        last = 0
+        while True:
+            chunk = pd.read_sql_query(query, conn, params=[last] + filters + [chunksize])
+            if chunk.empty:
+                return
+            last = int(chunk["_rowid"].iloc[-1])
+            yield _unpack_score_columns(chunk.drop(columns="_rowid"))
+            if len(chunk) < chunksize:
+                return
+    finally:
+        conn.close()
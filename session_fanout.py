@@ -0,0 +1,174 @@
+import asyncio
+import random
+import re
+import time
+
+from prompt_builder import count_tokens, fit_summaries, DEFAULT_TOKEN_BUDGET
+
+DEFAULT_MODEL = "deepseek-r1-distill-qwen-32b"
+
+SESSION_HEADER = (
+    "You are given emotion data for one session of a particular child, classified from images "
+    "(facial expression) and audio (voice). The session is summarised below: duration, number of "
+    "samples, how often the image and audio emotions agree, the share of time spent in each "
+    "emotion, the number of emotion changes, and the emotion segments in time order as "
+    "`emotion start-end` (MM:SS). Give a concise emotional profile of the child for this session "
+    "that a doctor can use. The data starts from here:\n"
+)
+
+MERGE_HEADER = (
+    "Below are emotional profiles of the same child, one per recorded session. Combine them into "
+    "one comprehensive emotional profile for a doctor: recurring patterns, changes across sessions, "
+    "and anything that needs attention. Present it aesthetically. The profiles start from here:\n"
+)
+
+# Per-session prompts are small; the merge prompt shortens every profile until all of them fit its budget
+SESSION_TOKEN_BUDGET = 1500
+MERGE_TOKEN_BUDGET = DEFAULT_TOKEN_BUDGET
+MAX_PROFILE_CHARS = 2000
+MIN_PROFILE_CHARS = 250
+
+_THINK_BLOCK = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+
+def strip_reasoning(text):
+    """Drop the <think>...</think> block reasoning models emit before their answer."""
+    return _THINK_BLOCK.sub("", text).strip()
+
+
+class RateLimiter:
+    """Space request starts so they stay under `requests_per_minute`."""
+
+    def __init__(self, requests_per_minute=None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _retry_delay(error, attempt):
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return min(30.0, 2 ** attempt) + random.random()
+
+
+async def stream_completion(client, prompt, model=DEFAULT_MODEL, on_token=None, max_retries=4, on_retry=None):
+    """Stream one chat completion, calling on_token(text) per delta. Retries on rate limiting.
+
+    A retry starts the answer over, so on_retry() is called first and the
+    caller should discard the tokens it has shown so far.
+    """
+    from groq import RateLimitError, APIConnectionError, InternalServerError
+
+    for attempt in range(max_retries + 1):
+        if attempt and on_retry:
+            on_retry()
+        try:
+            stream = await client.chat.completions.create(
+                messages=[{"role": "user", "content": prompt}], model=model, stream=True)
+            parts = []
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    if on_token:
+                        on_token(delta)
+            return "".join(parts)
+        except (RateLimitError, APIConnectionError, InternalServerError) as e:
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(_retry_delay(e, attempt))
+
+
+def _profile_block(session_id, text, limit):
+    if len(text) > limit:
+        text = text[:limit].rstrip() + " ..."
+    return f"Session {session_id[:8]}:\n{text}"
+
+
+def fit_profiles(profiles, token_budget=MERGE_TOKEN_BUDGET, tokenizer=count_tokens, header=MERGE_HEADER):
+    """Build the merge prompt from {session_id: profile} within `token_budget` tokens.
+
+    Every profile is cut to the same length, halved until the prompt fits; if
+    even MIN_PROFILE_CHARS each is too long, the profiles that do not fit are
+    left out, as fit_summaries does with sessions. Returns (prompt, info).
+    """
+    texts = [(session_id, strip_reasoning(text)) for session_id, text in profiles.items()]
+    limit = MAX_PROFILE_CHARS
+    while True:
+        prompt = header + "\n\n".join(_profile_block(session_id, text, limit) for session_id, text in texts)
+        tokens = tokenizer(prompt)
+        if tokens <= token_budget:
+            return prompt, {"tokens": tokens, "profile_chars": limit, "profiles": len(texts), "omitted_profiles": 0}
+        if limit <= MIN_PROFILE_CHARS:
+            break
+        limit = max(MIN_PROFILE_CHARS, limit // 2)
+
+    kept = []
+    used = tokenizer(header)
+    for session_id, text in texts:
+        block = _profile_block(session_id, text, limit)
+        cost = tokenizer(block + "\n\n")
+        if used + cost > token_budget:
+            break
+        kept.append(block)
+        used += cost
+    omitted = len(texts) - len(kept)
+    prompt = header + "\n\n".join(kept) + f"\n\n({omitted} further session profiles omitted to fit the context window.)"
+    return prompt, {"tokens": tokenizer(prompt), "profile_chars": limit, "profiles": len(kept),
+                    "omitted_profiles": omitted}
+
+
+async def analyze_sessions(client, summaries, model=DEFAULT_MODEL, on_session_token=None, on_merge_token=None,
+                           max_concurrency=4, requests_per_minute=None, on_session_retry=None, on_merge_retry=None,
+                           merge_token_budget=MERGE_TOKEN_BUDGET):
+    """Profile every session concurrently, then merge the profiles with one final call.
+
+    `summaries` come from prompt_builder.summarize_sessions. Tokens stream to
+    on_session_token(session_id, text) and on_merge_token(text) as they arrive;
+    on_session_retry(session_id) and on_merge_retry() mean that stream starts
+    over. A session that fails is left out of the merge instead of aborting it.
+    The merge prompt is fitted to `merge_token_budget` with fit_profiles.
+    Returns ({session_id: profile}, merged_profile, {session_id: error}).
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    limiter = RateLimiter(requests_per_minute)
+
+    async def profile(summary):
+        prompt, _ = fit_summaries([summary], token_budget=SESSION_TOKEN_BUDGET, header=SESSION_HEADER)
+        on_token = on_retry = None
+        if on_session_token:
+            on_token = lambda text: on_session_token(summary["session_id"], text)
+        if on_session_retry:
+            on_retry = lambda: on_session_retry(summary["session_id"])
+        async with semaphore:
+            await limiter.wait()
+            return await stream_completion(client, prompt, model, on_token, on_retry=on_retry)
+
+    results = await asyncio.gather(*(profile(summary) for summary in summaries), return_exceptions=True)
+    profiles = {}
+    failed = {}
+    for summary, result in zip(summaries, results):
+        if isinstance(result, Exception):
+            failed[summary["session_id"]] = result
+        else:
+            profiles[summary["session_id"]] = result
+    if failed and not profiles:
+        raise next(iter(failed.values()))
+
+    merge_prompt, _ = fit_profiles(profiles, token_budget=merge_token_budget)
+    await limiter.wait()
+    merged = await stream_completion(client, merge_prompt, model, on_merge_token, on_retry=on_merge_retry)
+    return profiles, merged, failed
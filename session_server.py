@@ -0,0 +1,481 @@
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+from camera import CameraSession, encode_jpeg
+from audio_stream import AudioStream
+from change_gate import FrameGate, AudioGate, LastLabels
+from emotion_labels import as_label, as_scores
+from fusion import FusionState
+from pipeline import StageStats
+from results_sink import BatchedSink, SQLiteSink, TeeSink
+
+DEFAULT_RESULTS = "session_results.sqlite"
+
+
+class VideoFileSource:
+    """Replay a recorded video as a session source, one frame per capture tick.
+
+    Frames are taken `interval` seconds of media time apart, so a recording is
+    classified at the same sampling rate as a live camera without waiting for
+    it to play in real time: SessionServer reads the next frame as soon as
+    the scheduler has room for it.
+    """
+
+    def __init__(self, path, interval=1.0, max_width=None, jpeg_quality=90):
+        self.path = path
+        self.interval = interval
+        self.max_width = max_width
+        self.jpeg_quality = jpeg_quality
+        self.finished = False
+        self.media_time = None  # position of the last frame read, in seconds
+        self._cap = None
+        self._position = 0.0
+
+    def open(self):
+        self._cap = cv2.VideoCapture(self.path)
+        if not self._cap.isOpened():
+            raise RuntimeError(f"Could not open video {self.path!r}")
+        return self
+
+    def read_frame(self, timeout=None):
+        if self._cap is None or self.finished:
+            return None
+        # Seek straight to the next sample instead of decoding every frame in between
+        self._cap.set(cv2.CAP_PROP_POS_MSEC, self._position * 1000)
+        ret, frame = self._cap.read()
+        if not ret:
+            self.finished = True
+            return None
+        self.media_time = self._position
+        self._position += self.interval
+        return frame
+
+    def encode(self, frame):
+        return encode_jpeg(frame, self.max_width, self.jpeg_quality)
+
+    def close(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+def open_video_source(source, interval=1.0, max_width=None, jpeg_quality=90):
+    """Camera index (int or digits), recorded video file, or stream URL."""
+    if isinstance(source, int) or str(source).isdigit():
+        return CameraSession(int(source), max_width=max_width, jpeg_quality=jpeg_quality)
+    if os.path.exists(source):
+        return VideoFileSource(source, interval, max_width=max_width, jpeg_quality=jpeg_quality)
+    return CameraSession(source, max_width=max_width, jpeg_quality=jpeg_quality)
+
+
+class FairScheduler:
+    """Shared worker pool that takes jobs from sessions in round-robin order.
+
+    Each session has its own small queue. When a session produces faster than
+    the pool keeps up, its oldest pending job is dropped, so one busy room can
+    delay the others by at most one job per turn. A session's jobs run one at a
+    time and in order, so its rows, gates and fusion state see ticks in sequence.
+    """
+
+    def __init__(self, workers=4, max_pending=2):
+        self.num_workers = workers
+        self.max_pending = max(1, max_pending)
+        self._queues = {}
+        self._turns = deque()  # idle sessions with pending jobs, in the order they get served
+        self._scheduled = set()  # sessions in _turns or running a job
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = []
+
+    def submit(self, session_id, job):
+        """Queue a callable for a session. Returns the number of jobs dropped to make room."""
+        with self._cond:
+            pending = self._queues.setdefault(session_id, deque())
+            dropped = 0
+            if len(pending) >= self.max_pending:
+                pending.popleft()
+                dropped = 1
+            pending.append(job)
+            if session_id not in self._scheduled:
+                self._scheduled.add(session_id)
+                self._turns.append(session_id)
+                self._cond.notify()
+            return dropped
+
+    def pending(self, session_id):
+        with self._cond:
+            return len(self._queues.get(session_id, ()))
+
+    def wait_for_room(self, session_id, timeout=None):
+        """Block until the session can queue a job without dropping one. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._closed or len(self._queues.get(session_id, ())) < self.max_pending, timeout)
+
+    def _next_job(self):
+        with self._cond:
+            while not self._turns and not self._closed:
+                self._cond.wait()
+            if not self._turns:
+                return None
+            session_id = self._turns.popleft()
+            # The session stays in _scheduled while its job runs; _finish puts it back in turn
+            job = self._queues[session_id].popleft()
+            self._cond.notify_all()  # wakes producers in wait_for_room
+            return session_id, job
+
+    def _finish(self, session_id):
+        with self._cond:
+            if self._queues[session_id]:
+                self._turns.append(session_id)
+                self._cond.notify()
+            else:
+                self._scheduled.discard(session_id)
+
+    def _worker(self):
+        while True:
+            session_id = None
+            try:
+                next_job = self._next_job()
+                if next_job is None:
+                    return
+                session_id, job = next_job
+                job()
+            except Exception as e:
+                print(f"Session job failed: {e}")
+            finally:
+                if session_id is not None:
+                    self._finish(session_id)
+
+    def start(self):
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._worker, name=f"session-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Finish the queued jobs, then stop the workers."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+
+class CaptureSession:
+    """One subject: a video source, an optional microphone, and per-session gating, fusion and stats."""
+
+    def __init__(self, session_id, source, audio_device=None, interval=1.0, audio_window=5.0,
+                 frame_threshold=6.0, silence_threshold=0.01, max_width=None, jpeg_quality=90):
+        self.session_id = session_id
+        self.source = source
+        self.interval = interval
+        self.video = open_video_source(source, interval, max_width=max_width, jpeg_quality=jpeg_quality)
+        self.microphone = (AudioStream(window=audio_window, hop=audio_window, device=audio_device)
+                           if audio_device is not None else None)
+        self.frame_gate = FrameGate(frame_threshold) if frame_threshold > 0 else None
+        self.audio_gate = AudioGate(silence_threshold) if silence_threshold > 0 else None
+        self.last_scores = LastLabels()
+        self.fusion = FusionState()
+
+        self.captured = 0
+        self.written = 0
+        self.dropped = 0
+        self.lag = StageStats("lag")
+        self._write_times = deque()
+        self._lock = threading.Lock()
+        self.started_at = None
+
+    @property
+    def finished(self):
+        return getattr(self.video, "finished", False)
+
+    @property
+    def recorded(self):
+        return isinstance(self.video, VideoFileSource)
+
+    def open(self):
+        self.video.open()
+        if self.microphone is not None:
+            self.microphone.start()
+        self.started_at = time.monotonic()
+
+    def close(self):
+        self.video.close()
+        if self.microphone is not None:
+            self.microphone.stop()
+
+    def capture(self):
+        """Grab one tick; payloads the gates reject come back as None with the reused flag set."""
+        frame = self.video.read_frame()
+        audio = None
+        if self.microphone is not None:
+            # Never block on audio: a tick without a new complete window reuses the last audio result
+            audio = self.microphone.next_window(timeout=0)
+        now = time.monotonic()
+        # Recorded files are stamped with their media time, live sources with time since the session started
+        timestamp = getattr(self.video, "media_time", None)
+        if timestamp is None:
+            timestamp = now - self.started_at
+        tick = {"timestamp": timestamp, "captured_at": now, "image": frame, "audio": audio,
+                "image_reused": False, "audio_reused": self.microphone is not None and audio is None}
+        if frame is not None and self.frame_gate and not self.frame_gate.should_classify(frame):
+            tick["image"], tick["image_reused"] = None, True
+        if audio is not None and self.audio_gate and not self.audio_gate.should_classify(audio):
+            tick["audio"], tick["audio_reused"] = None, True
+        self.captured += 1
+        return tick
+
+    def record_write(self, captured_at):
+        now = time.monotonic()
+        self.lag.record(now - captured_at)
+        self.written += 1
+        self._write_times.append(now)
+        while self._write_times and self._write_times[0] < now - 60:
+            self._write_times.popleft()
+
+    def stats(self):
+        lag = self.lag.snapshot()
+        return {
+            "source": str(self.source),
+            "captured": self.captured,
+            "written": self.written,
+            "dropped": self.dropped,
+            "rows_per_minute": len(self._write_times),
+            "lag_mean": lag["mean"],
+            "lag_max": lag["max"],
+            "lag_last": lag["last"],
+            "finished": self.finished,
+        }
+
+
+class SessionServer:
+    """Runs many capture sessions against one set of classifiers and one results store.
+
+    Every session captures on its own thread; classification jobs from all
+    sessions go through one FairScheduler, so the models (or API clients) are
+    loaded once and shared. `classify_image(frame, session)` and
+    `classify_audio(window)` return score vectors over emotion_labels.EMOTIONS.
+    """
+
+    def __init__(self, sink, classify_image, classify_audio, workers=4, max_pending=2):
+        self.sink = sink
+        self.classify_image = classify_image
+        self.classify_audio = classify_audio
+        self.scheduler = FairScheduler(workers, max_pending)
+        self.sessions = {}
+        self._stop = threading.Event()
+        self._threads = []
+
+    def add_session(self, session):
+        self.sessions[session.session_id] = session
+        return session
+
+    def _capture_loop(self, session):
+        next_tick = time.monotonic()
+        while not self._stop.is_set() and not session.finished:
+            # Recordings are read as fast as the workers take their ticks: wait for room instead of a deadline
+            if session.recorded and not self.scheduler.wait_for_room(session.session_id, timeout=0.5):
+                continue
+            tick = session.capture()
+            session.dropped += self.scheduler.submit(session.session_id, lambda tick=tick: self._process(session, tick))
+            if session.recorded:
+                continue
+            next_tick += session.interval
+            # Skip deadlines already missed instead of bursting to catch up
+            if next_tick < time.monotonic():
+                next_tick = time.monotonic()
+            self._stop.wait(max(0.0, next_tick - time.monotonic()))
+
+    def _process(self, session, tick):
+        image_scores = self.classify_image(tick["image"], session) if tick["image"] is not None else None
+        audio_scores = self.classify_audio(tick["audio"]) if tick["audio"] is not None else None
+
+        # Reused results, fusion and stats are per session; jobs of one session may run on different workers
+        with session._lock:
+            if tick["image_reused"]:
+                image_scores = session.last_scores.get("image")
+            else:
+                session.last_scores.set("image", image_scores)
+            if tick["audio_reused"]:
+                audio_scores = session.last_scores.get("audio")
+            else:
+                session.last_scores.set("audio", audio_scores)
+            fused_result = session.fusion.update(as_scores(image_scores), as_scores(audio_scores))
+            self.sink.write({
+                "session_id": session.session_id,
+                "timestamp": tick["timestamp"],
+                "image_result": as_label(image_scores),
+                "audio_result": as_label(audio_scores),
+                "image_reused": int(tick["image_reused"]),
+                "audio_reused": int(tick["audio_reused"]),
+                "fused_result": fused_result,
+                "image_scores": as_scores(image_scores),
+                "audio_scores": as_scores(audio_scores),
+            })
+            session.record_write(tick["captured_at"])
+
+    def start(self):
+        """Open every session, then start capturing; if any source fails to open, all are closed again."""
+        try:
+            for session in self.sessions.values():
+                session.open()
+        except Exception:
+            for session in self.sessions.values():
+                session.close()
+            raise
+        self.scheduler.start()
+        for session in self.sessions.values():
+            thread = threading.Thread(target=self._capture_loop, args=(session,),
+                                      name=f"capture-{session.session_id[:8]}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def running(self):
+        """True while any session is still capturing (recorded files end on their own)."""
+        return any(thread.is_alive() for thread in self._threads)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self.scheduler.stop()
+        for session in self.sessions.values():
+            session.close()
+
+    def stats(self):
+        return {session_id: dict(session.stats(), pending=self.scheduler.pending(session_id))
+                for session_id, session in self.sessions.items()}
+
+    def report(self):
+        for session_id, stats in self.stats().items():
+            print(f"{session_id[:8]} {stats['source']:<20} rows/min={stats['rows_per_minute']:<4} "
+                  f"written={stats['written']:<6} dropped={stats['dropped']:<4} pending={stats['pending']} "
+                  f"lag mean={stats['lag_mean']:.2f}s max={stats['lag_max']:.2f}s")
+
+
+class StatsHandler(BaseHTTPRequestHandler):
+    """GET /sessions returns per-session throughput and lag as JSON."""
+
+    server_version = "SessionServer/1.0"
+
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/sessions"):
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.session_server.stats(), indent=2).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_stats(session_server, host="127.0.0.1", port=8010):
+    """Serve StatsHandler on a daemon thread and return the HTTP server."""
+    httpd = ThreadingHTTPServer((host, port), StatsHandler)
+    httpd.session_server = session_server
+    threading.Thread(target=httpd.serve_forever, name="session-stats", daemon=True).start()
+    return httpd
+
+
+def make_classifiers(local=False):
+    """Score-vector classifiers shared by all sessions: the HF API clients, or the local micro-batched engines."""
+    if local:
+        from PIL import Image
+        from image_classification import classify_image_scores
+        from audio_classification import classify_audio_scores
+
+        def classify_image(frame, session):
+            return classify_image_scores(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+        return classify_image, classify_audio_scores
+
+    from image_api_call import classify_image_scores
+    from audio_api_call import classify_audio_scores
+
+    def classify_image(frame, session):
+        return classify_image_scores(session.video.encode(frame))
+    return classify_image, classify_audio_scores
+
+
+def load_session_configs(config_path=None, sources=()):
+    """Session settings from a JSON list of {"source", "audio_device", "session_id", ...} and/or --source values."""
+    configs = []
+    if config_path:
+        with open(config_path) as f:
+            configs.extend(json.load(f))
+    configs.extend({"source": source} for source in sources)
+    for config in configs:
+        config.setdefault("session_id", str(uuid.uuid4()))
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture and classify many sessions with shared models.")
+    parser.add_argument("--source", action="append", default=[],
+                        help="camera index, video file or stream URL; repeat for more sessions")
+    parser.add_argument("--config", help="JSON list of session settings (source, audio_device, session_id, ...)")
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="SQLite results database")
+    parser.add_argument("--summary", default=None,
+                        help="also keep this per-session summary database (e.g. session_summary.sqlite) "
+                             "up to date with every batch")
+    parser.add_argument("--workers", type=int, default=4, help="classification workers shared by all sessions")
+    parser.add_argument("--max-pending", type=int, default=2,
+                        help="queued ticks per session before its oldest is dropped")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between ticks of each session")
+    parser.add_argument("--local", action="store_true", help="use the local transformers models instead of the API")
+    parser.add_argument("--port", type=int, default=8010, help="port of the /sessions stats endpoint; 0 disables")
+    parser.add_argument("--report-every", type=float, default=30.0)
+    args = parser.parse_args()
+
+    configs = load_session_configs(args.config, args.source)
+    if not configs:
+        parser.error("give at least one --source or a --config file")
+
+    classify_image, classify_audio = make_classifiers(args.local)
+    # SQLite in WAL mode behind one writer thread is safe for every session to share
+    sink = SQLiteSink(args.results)
+    if args.summary:
+        from session_summary import SummarySink
+
+        sink = TeeSink(sink, SummarySink(args.summary))
+    sink = BatchedSink(sink)
+    server = SessionServer(sink, classify_image, classify_audio, workers=args.workers, max_pending=args.max_pending)
+    for config in configs:
+        config.setdefault("interval", args.interval)
+        server.add_session(CaptureSession(**config))
+
+    httpd = serve_stats(server, port=args.port) if args.port else None
+    server.start()
+    print(f"Running {len(configs)} sessions with {args.workers} shared workers")
+    last_report = time.monotonic()
+    try:
+        while server.running:
+            time.sleep(1.0)
+            if time.monotonic() - last_report >= args.report_every:
+                server.report()
+                last_report = time.monotonic()
+    except KeyboardInterrupt:
+        print("Stopping sessions...")
+    finally:
+        server.stop()
+        server.report()
+        sink.close()
+        if httpd is not None:
+            httpd.shutdown()
+
+
+if __name__ == "__main__":
+    main()
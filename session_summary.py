@@ -0,0 +1,351 @@
+import argparse
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from emotion_labels import is_result, normalize_label
+from results_sink import ResultsSink
+
+DEFAULT_PATH = "session_summary.sqlite"
+MODALITIES = ("image", "audio")
+SUMMARY_TABLES = ("session_summary", "session_emotions", "session_transitions", "session_pairs")
+
+
+def create_summary_schema(conn):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS session_summary (
+            session_id TEXT PRIMARY KEY,
+            first_timestamp REAL,
+            last_timestamp REAL,
+            samples INTEGER NOT NULL DEFAULT 0,
+            agreements INTEGER NOT NULL DEFAULT 0,
+            last_image TEXT,
+            last_audio TEXT
+        );
+        CREATE TABLE IF NOT EXISTS session_emotions (
+            session_id TEXT NOT NULL,
+            modality TEXT NOT NULL,
+            emotion TEXT NOT NULL,
+            samples INTEGER NOT NULL DEFAULT 0,
+            dwell REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (session_id, modality, emotion)
+        );
+        CREATE TABLE IF NOT EXISTS session_transitions (
+            session_id TEXT NOT NULL,
+            modality TEXT NOT NULL,
+            from_emotion TEXT NOT NULL,
+            to_emotion TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (session_id, modality, from_emotion, to_emotion)
+        );
+        CREATE TABLE IF NOT EXISTS session_pairs (
+            session_id TEXT NOT NULL,
+            image_emotion TEXT NOT NULL,
+            audio_emotion TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (session_id, image_emotion, audio_emotion)
+        );
+    """)
+
+
+def _add(totals, key, amount):
+    totals[key] = totals.get(key, 0) + amount
+
+
+def _add_emotion(totals, key, samples, dwell):
+    counts = totals.setdefault(key, [0, 0.0])
+    counts[0] += samples
+    counts[1] += dwell
+
+
+class SessionSummaryStore:
+    """Per-session aggregates kept up to date as result rows are appended.
+
+    For every session it stores duration, sample count, image/audio agreement,
+    per-emotion sample counts and dwell time, transition counts and the
+    image x audio label pairs, so reports read O(sessions) rows instead of
+    O(rows). Dwell follows emotion_labels.run_length_spans: the time from one
+    sample to the next is credited to the earlier sample's emotion.
+
+    Rows of a session must arrive in timestamp order, as the capture loop
+    writes them; a row older than the session's latest one still counts as a
+    sample but adds no dwell or transition. Failed or missing labels count as
+    samples only: they are left out of agreement, dwell and transitions.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        create_summary_schema(self._conn)
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def _session_state(self, session_id):
+        state = self._state.get(session_id)
+        if state is None:
+            row = self._conn.execute(
+                "SELECT first_timestamp, last_timestamp, samples, agreements, last_image, last_audio "
+                "FROM session_summary WHERE session_id = ?", (session_id,)).fetchone()
+            state = self._state[session_id] = list(row) if row else [None, None, 0, 0, None, None]
+        return state
+
+    def update(self, rows):
+        """Fold a batch of result rows into the summaries in one transaction."""
+        emotions = {}
+        transitions = {}
+        pairs = {}
+        with self._lock:
+            touched = set()
+            for row in rows:
+                session_id = str(row["session_id"])
+                timestamp = float(row["timestamp"])
+                # Failed and missing classifications add to the sample count only
+                labels = {modality: row.get(f"{modality}_result") if is_result(row.get(f"{modality}_result")) else None
+                          for modality in MODALITIES}
+                state = self._session_state(session_id)
+                first, last, samples, agreements, last_image, last_audio = state
+                previous = {"image": last_image, "audio": last_audio}
+                in_order = last is None or timestamp >= last
+
+                for modality in MODALITIES:
+                    label = labels[modality]
+                    if label is not None:
+                        _add_emotion(emotions, (session_id, modality, label), 1, 0.0)
+                    if in_order and last is not None and previous[modality] is not None:
+                        _add_emotion(emotions, (session_id, modality, previous[modality]), 0, timestamp - last)
+                        if label is not None:
+                            _add(transitions, (session_id, modality, previous[modality], label), 1)
+
+                if labels["image"] is not None and labels["audio"] is not None:
+                    _add(pairs, (session_id, labels["image"], labels["audio"]), 1)
+                    if normalize_label(labels["image"]) == normalize_label(labels["audio"]):
+                        agreements += 1
+
+                state[0] = timestamp if first is None else min(first, timestamp)
+                state[2] = samples + 1
+                state[3] = agreements
+                if in_order:
+                    state[1] = timestamp
+                    state[4] = labels["image"]
+                    state[5] = labels["audio"]
+                touched.add(session_id)
+
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO session_summary (session_id, first_timestamp, last_timestamp, samples, agreements, "
+                    "last_image, last_audio) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (session_id) DO UPDATE SET first_timestamp = excluded.first_timestamp, "
+                    "last_timestamp = excluded.last_timestamp, samples = excluded.samples, "
+                    "agreements = excluded.agreements, last_image = excluded.last_image, "
+                    "last_audio = excluded.last_audio",
+                    [(session_id, *self._state[session_id]) for session_id in touched])
+                self._conn.executemany(
+                    "INSERT INTO session_emotions (session_id, modality, emotion, samples, dwell) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (session_id, modality, emotion) DO UPDATE SET "
+                    "samples = samples + excluded.samples, dwell = dwell + excluded.dwell",
+                    [key + tuple(counts) for key, counts in emotions.items()])
+                self._conn.executemany(
+                    "INSERT INTO session_transitions (session_id, modality, from_emotion, to_emotion, count) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (session_id, modality, from_emotion, to_emotion) "
+                    "DO UPDATE SET count = count + excluded.count",
+                    [key + (count,) for key, count in transitions.items()])
+                self._conn.executemany(
+                    "INSERT INTO session_pairs (session_id, image_emotion, audio_emotion, count) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT (session_id, image_emotion, audio_emotion) "
+                    "DO UPDATE SET count = count + excluded.count",
+                    [key + (count,) for key, count in pairs.items()])
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def _where(self, sessions, prefix="WHERE"):
+        if sessions is None:
+            return "", []
+        sessions = list(sessions)
+        if not sessions:
+            # No session selected: a constant-false filter returns the usual empty frame without a scan
+            return f" {prefix} 0", []
+        return f" {prefix} session_id IN ({', '.join('?' * len(sessions))})", sessions
+
+    def session_stats(self, sessions=None):
+        """One row per session: min/max timestamp, sample count and agreement, shaped for plot_session_statistics."""
+        where, params = self._where(sessions)
+        stats = self._query(
+            "SELECT session_id, first_timestamp AS min_timestamp, last_timestamp AS max_timestamp, "
+            "samples AS num_points, agreements, "
+            # Agreement is over the samples where both modalities have a result, which session_pairs counts
+            "(SELECT COALESCE(SUM(p.count), 0) FROM session_pairs p WHERE p.session_id = session_summary.session_id) "
+            f"AS compared FROM session_summary{where}", params)
+        stats["agreement"] = stats["agreements"] / stats["compared"].where(stats["compared"] > 0)
+        return stats.drop(columns=["agreements", "compared"])
+
+    def emotion_counts(self, modality, sessions=None):
+        """Samples per emotion over the selected sessions, like value_counts on the raw column."""
+        where, params = self._where(sessions, "AND")
+        counts = self._query(
+            "SELECT emotion, SUM(samples) AS samples FROM session_emotions "
+            f"WHERE modality = ?{where} GROUP BY emotion HAVING SUM(samples) > 0", [modality] + params)
+        return counts.set_index("emotion")["samples"].rename(f"{modality}_result").rename_axis(f"{modality}_result")
+
+    def crosstab(self, sessions=None):
+        """Image x audio label counts, like pd.crosstab on the raw columns."""
+        where, params = self._where(sessions)
+        pairs = self._query(
+            f"SELECT image_emotion, audio_emotion, SUM(count) AS count FROM session_pairs{where} "
+            "GROUP BY image_emotion, audio_emotion", params)
+        table = pairs.pivot(index="image_emotion", columns="audio_emotion", values="count").fillna(0).astype("int64")
+        return table.rename_axis(index="image_result", columns="audio_result")
+
+    def transitions(self, modality, sessions=None):
+        """Square from x to transition count matrix, like visualizer.compute_transitions."""
+        where, params = self._where(sessions, "AND")
+        counts = self._query(
+            "SELECT from_emotion, to_emotion, SUM(count) AS count FROM session_transitions "
+            f"WHERE modality = ?{where} GROUP BY from_emotion, to_emotion", [modality] + params)
+        categories = sorted(self.emotion_counts(modality, sessions).index)
+        table = counts.pivot(index="from_emotion", columns="to_emotion", values="count")
+        return table.reindex(index=categories, columns=categories).fillna(0).astype("int64")
+
+    def summaries(self, sessions=None):
+        """Per-session dicts in the shape of prompt_builder.summarize_session (without segment lists)."""
+        stats = self.session_stats(sessions)
+        where, params = self._where(sessions)
+        dwell = self._query(f"SELECT session_id, modality, emotion, dwell FROM session_emotions{where}", params)
+        where, params = self._where(sessions, "AND")
+        changes = self._query(
+            "SELECT session_id, modality, SUM(count) AS changes FROM session_transitions "
+            f"WHERE from_emotion != to_emotion{where} GROUP BY session_id, modality", params)
+
+        dwell_by_session = {}
+        for session_id, modality, emotion, seconds in dwell.itertuples(index=False):
+            if seconds > 0:
+                by_label = dwell_by_session.setdefault((session_id, modality), {})
+                label = normalize_label(emotion)
+                by_label[label] = by_label.get(label, 0.0) + seconds
+        change_counts = {(session_id, modality): int(count)
+                         for session_id, modality, count in changes.itertuples(index=False)}
+
+        summaries = []
+        for row in stats.itertuples(index=False):
+            summary = {
+                "session_id": row.session_id,
+                "duration": float(row.max_timestamp - row.min_timestamp),
+                "samples": int(row.num_points),
+                "agreement": float(row.agreement) if pd.notna(row.agreement) else 0.0,
+            }
+            for modality in MODALITIES:
+                summary[f"{modality}_segments"] = []
+                summary[f"{modality}_dwell"] = dwell_by_session.get((row.session_id, modality), {})
+                summary[f"{modality}_changes"] = change_counts.get((row.session_id, modality), 0)
+            summaries.append(summary)
+        return summaries
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class SummarySink(ResultsSink):
+    """Results sink that keeps a SessionSummaryStore current; combine it with a row sink through TeeSink."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.store = SessionSummaryStore(path)
+
+    def write(self, row):
+        self.store.update([row])
+
+    def write_many(self, rows):
+        self.store.update(rows)
+
+    def close(self):
+        self.store.close()
+
+
+def build_summary(results_path, summary_path=DEFAULT_PATH, chunksize=500_000):
+    """Backfill a summary database from an existing results archive, streamed in chunks.
+
+    The archive is summarised into a scratch database first; its sessions then
+    replace any existing summaries of the same sessions in one transaction, so
+    rerunning the backfill, or running it over sessions live capture already
+    indexed, never counts a row twice. Don't run it while those sessions are
+    still being captured.
+    """
+    from archive_loader import iter_chunks
+
+    build_path = summary_path + ".build"
+    _remove_database(build_path)
+    store = SessionSummaryStore(build_path)
+    try:
+        for chunk in iter_chunks(results_path, chunksize=chunksize):
+            chunk = chunk.astype({"session_id": object, "image_result": object, "audio_result": object})
+            # The store needs each session in time order; a stable sort keeps chunk order otherwise
+            chunk = chunk.sort_values(["session_id", "timestamp"], kind="stable")
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            store.update(chunk.to_dict("records"))
+    finally:
+        store.close()
+
+    conn = sqlite3.connect(summary_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        create_summary_schema(conn)
+        conn.execute("ATTACH DATABASE ? AS build", (build_path,))
+        with conn:
+            for table in SUMMARY_TABLES:
+                conn.execute(f"DELETE FROM {table} WHERE session_id IN (SELECT session_id FROM build.session_summary)")
+                conn.execute(f"INSERT INTO {table} SELECT * FROM build.{table}")
+        conn.execute("DETACH DATABASE build")
+    finally:
+        conn.close()
+    _remove_database(build_path)
+
+
+def _remove_database(path):
+    for name in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def render_summary_figures(summary_path, output_dir=".", dpi=300, fmt="png", sessions=None):
+    """Draw the distribution, correlation, transition and statistics figures straight from the summary index."""
+    import visualizer
+
+    store = SessionSummaryStore(summary_path)
+    try:
+        session_stats = store.session_stats(sessions)
+        print(f"Loaded summaries of {len(session_stats)} sessions")
+        if session_stats.empty:
+            return []
+        return [
+            visualizer.plot_emotion_distribution(store.emotion_counts("image", sessions),
+                                                 store.emotion_counts("audio", sessions),
+                                                 output_dir=output_dir, dpi=dpi, fmt=fmt),
+            visualizer.plot_emotion_correlation(store.crosstab(sessions), output_dir=output_dir, dpi=dpi, fmt=fmt),
+            visualizer.plot_emotion_transitions(store.transitions("image", sessions),
+                                                store.transitions("audio", sessions),
+                                                output_dir=output_dir, dpi=dpi, fmt=fmt),
+            visualizer.plot_session_statistics(session_stats, output_dir=output_dir, dpi=dpi, fmt=fmt),
+        ]
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the per-session summary index from a results archive.")
+    parser.add_argument("results_path", help="results file (.csv or .parquet)")
+    parser.add_argument("--summary", default=DEFAULT_PATH, help="summary database to create or extend")
+    parser.add_argument("--chunksize", type=int, default=500_000)
+    args = parser.parse_args()
+    build_summary(args.results_path, args.summary, args.chunksize)
+    print(f"Summaries written to {args.summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import hashlib
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Labels the stub returns for each model; anything else gets the image labels
+MODEL_LABELS = {
+    "dima806/facial_emotions_image_detection":
+        ["happy", "sad", "angry", "surprise", "fear", "disgust", "neutral"],
+    "firdhokk/speech-emotion-recognition-with-openai-whisper-large-v3":
+        ["happy", "sad", "angry", "fearful", "surprised", "neutral", "calm", "disgust"],
+}
+
+
+def stub_scores(model_id, body):
+    """Deterministic [{label, score}, ...] for a request body, sorted by score like the real API."""
+    labels = MODEL_LABELS.get(model_id, MODEL_LABELS["dima806/facial_emotions_image_detection"])
+    digest = hashlib.sha256(body).digest()
+    weights = [digest[i] + 1 for i in range(len(labels))]
+    total = sum(weights)
+    scores = [{"label": label, "score": weight / total} for label, weight in zip(labels, weights)]
+    return sorted(scores, key=lambda item: item["score"], reverse=True)
+
+
+def stub_completion_text(prompt):
+    """Deterministic canned answer that echoes the size of the prompt."""
+    return f"<think>stub reasoning</think>Stub emotional profile for a prompt of {len(prompt)} characters."
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the HF inference API and an OpenAI/Groq-style chat completions endpoint.
+
+    POST /models/<model_id> with raw bytes returns label scores; POST
+    .../chat/completions returns a canned answer, streamed as SSE when asked.
+    """
+
+    latency = 0.0
+    fail_rate = 0.0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.path.endswith("/chat/completions"):
+            self._chat_completion(json.loads(body or b"{}"))
+            return
+        if not self.path.startswith("/models/"):
+            self._send(404, {"error": "not found"})
+            return
+        if random.random() < self.fail_rate:
+            # Simulate the transient overload the client has to retry through
+            self._send(random.choice([429, 503]), {"error": "overloaded"}, {"Retry-After": "0"})
+            return
+
+        model_id = self.path[len("/models/"):]
+        self._send(200, stub_scores(model_id, body))
+
+    def _chat_completion(self, request):
+        if random.random() < self.fail_rate:
+            self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}}, {"retry-after": "0"})
+            return
+
+        prompt = "".join(message.get("content", "") for message in request.get("messages", []))
+        text = stub_completion_text(prompt)
+        model = request.get("model", "stub")
+        base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": model}
+
+        if not request.get("stream"):
+            self._send(200, dict(base, object="chat.completion", choices=[{
+                "index": 0, "finish_reason": "stop",
+                "message": {"role": "assistant", "content": text}}],
+                usage={"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4,
+                       "total_tokens": (len(prompt) + len(text)) // 4}))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word + (" " if i < len(words) - 1 else "")}
+            chunk = dict(base, object="chat.completion.chunk",
+                         choices=[{"index": 0, "delta": delta, "finish_reason": None}])
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        done = dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+        self.wfile.flush()
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=8080, latency=0.0, fail_rate=0.0):
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"latency": latency, "fail_rate": fail_rate})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stub of the inference API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 429/503")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.fail_rate)
+    print(f"Stub inference server on http://{args.host}:{args.port}/models "
+          f"(set HF_INFERENCE_URL to this address)")
+    print(f"Stub chat completions on http://{args.host}:{args.port} "
+          f"(set GROQ_BASE_URL to this address)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+from PIL import Image
+
+import image_classification
+
+DEFAULT_SAMPLE_FPS = 2.0
+DEFAULT_BATCH_SIZE = 16
+
+
+def iter_keyframes(source, sample_fps=DEFAULT_SAMPLE_FPS, max_width=None, frame_times=None):
+    """Decode a video one frame at a time and yield (seconds, RGB PIL image) about `sample_fps` times a second.
+
+    Only the sampled frames are converted; the rest are grabbed and dropped,
+    so memory stays at one frame whatever the clip length. `frame_times`
+    gives each frame's capture time when it is known, instead of deriving
+    it from the container's nominal frame rate.
+    """
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {source}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if not fps or fps <= 0:
+        fps = 30.0
+    interval = 1.0 / sample_fps
+    next_time = 0.0
+    index = 0
+    try:
+        while cap.grab():
+            seconds = frame_times[index] if frame_times is not None and index < len(frame_times) else index / fps
+            index += 1
+            if seconds + 1e-6 < next_time:
+                continue
+            ok, frame = cap.retrieve()
+            if not ok:
+                continue
+            next_time += interval
+            if max_width and frame.shape[1] > max_width:
+                scale = max_width / frame.shape[1]
+                frame = cv2.resize(frame, (max_width, int(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+            yield seconds, Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    finally:
+        cap.release()
+
+
+def _batches(keyframes, batch_size):
+    batch = []
+    for item in keyframes:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def classify_clip(source, sample_fps=DEFAULT_SAMPLE_FPS, batch_size=DEFAULT_BATCH_SIZE, max_width=None,
+                  engine=None, frame_times=None):
+    """Classify a video clip from its sampled keyframes.
+
+    Keyframes are run through the image model in batches and every label's
+    probability is kept, so the clip result is the mean distribution over
+    keyframes rather than a single frame's top label. Returns a dict with
+    `label`, `distribution` ({label: probability}), `labels`, `times`,
+    `probabilities` (keyframes x labels) and `timeline` [(seconds, label, score)].
+    `frame_times` is passed through to iter_keyframes.
+    """
+    engine = engine or image_classification.engine
+    labels = engine.labels
+    column = {label: i for i, label in enumerate(labels)}
+
+    times = []
+    rows = []
+    for batch in _batches(iter_keyframes(source, sample_fps, max_width, frame_times), batch_size):
+        results = engine.classify_batch([image for _, image in batch], top_k=len(labels))
+        for (seconds, _), result in zip(batch, results):
+            row = np.zeros(len(labels), dtype=np.float32)
+            for entry in result:
+                row[column[entry["label"]]] = entry["score"]
+            times.append(seconds)
+            rows.append(row)
+
+    if not rows:
+        return {"label": None, "distribution": {}, "labels": labels, "times": np.zeros(0),
+                "probabilities": np.zeros((0, len(labels)), dtype=np.float32), "timeline": []}
+
+    probabilities = np.vstack(rows)
+    mean = probabilities.mean(axis=0)
+    top = probabilities.argmax(axis=1)
+    return {
+        "label": labels[int(mean.argmax())],
+        "distribution": {label: float(p) for label, p in zip(labels, mean)},
+        "labels": labels,
+        "times": np.asarray(times),
+        "probabilities": probabilities,
+        "timeline": [(float(t), labels[i], float(probabilities[n, i])) for n, (t, i) in enumerate(zip(times, top))],
+    }
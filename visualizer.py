@@ -2,24 +2,37 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
+import os
 from collections import defaultdict
-import matplotlib.dates as mdates
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.ticker import FuncFormatter
+from results_sink import read_results
+from emotion_labels import run_length_spans
 
-def load_data(file_path):
-    """Load emotion data from CSV file."""
-    df = pd.read_csv(file_path)
+def figure_path(output_dir, name, fmt='png'):
+    return os.path.join(output_dir, f'{name}.{fmt}')
+
+def load_data(file_path, columns=None, sessions=None):
+    """Load emotion data from a results file (CSV, SQLite or Parquet)."""
+    df = read_results(file_path, columns=columns, sessions=sessions)
     # Convert timestamp to seconds
-    df['timestamp'] = pd.to_numeric(df['timestamp'])
+    if 'timestamp' in df.columns:
+        df['timestamp'] = pd.to_numeric(df['timestamp'])
     return df
 
-def visualize_emotion_distribution(df):
+def visualize_emotion_distribution(df, output_dir='.', dpi=300, fmt='png'):
     """Create bar charts showing the distribution of emotions."""
+    return plot_emotion_distribution(df['image_result'].value_counts(sort=False),
+                                     df['audio_result'].value_counts(sort=False),
+                                     output_dir=output_dir, dpi=dpi, fmt=fmt)
+
+def plot_emotion_distribution(image_counts, audio_counts, output_dir='.', dpi=300, fmt='png'):
+    """Draw the emotion distribution bar charts from precomputed label counts."""
     plt.figure(figsize=(15, 10))
     
     # Image emotions distribution
     plt.subplot(2, 1, 1)
-    sns.countplot(x='image_result', data=df, palette='viridis')
+    sns.barplot(x=image_counts.index.astype(str), y=image_counts.values, palette='viridis')
     plt.title('Distribution of Image Emotions', fontsize=16)
     plt.xlabel('Emotion', fontsize=14)
     plt.ylabel('Count', fontsize=14)
@@ -28,7 +41,7 @@ def visualize_emotion_distribution(df):
     
     # Audio emotions distribution
     plt.subplot(2, 1, 2)
-    sns.countplot(x='audio_result', data=df, palette='magma')
+    sns.barplot(x=audio_counts.index.astype(str), y=audio_counts.values, palette='magma')
     plt.title('Distribution of Audio Emotions', fontsize=16)
     plt.xlabel('Emotion', fontsize=14)
     plt.ylabel('Count', fontsize=14)
@@ -36,14 +49,21 @@ def visualize_emotion_distribution(df):
     plt.grid(axis='y', linestyle='--', alpha=0.7)
     
     plt.tight_layout()
-    plt.savefig('emotion_distribution.png', dpi=300)
+    output_file = figure_path(output_dir, 'emotion_distribution', fmt)
+    plt.savefig(output_file, dpi=dpi)
     plt.close()
-    print("Saved emotion distribution chart as 'emotion_distribution.png'")
+    print(f"Saved emotion distribution chart as '{output_file}'")
+    return output_file
 
-def visualize_emotion_correlation(df):
+def visualize_emotion_correlation(df, output_dir='.', dpi=300, fmt='png'):
     """Create a heatmap showing correlation between image and audio emotions."""
     # Create a cross-tabulation of image and audio emotions
-    emotion_cross = pd.crosstab(df['image_result'], df['audio_result'], normalize='index')
+    emotion_counts = pd.crosstab(df['image_result'], df['audio_result'])
+    return plot_emotion_correlation(emotion_counts, output_dir=output_dir, dpi=dpi, fmt=fmt)
+
+def plot_emotion_correlation(emotion_counts, output_dir='.', dpi=300, fmt='png'):
+    """Draw the image/audio heatmap from a crosstab of raw co-occurrence counts."""
+    emotion_cross = emotion_counts.div(emotion_counts.sum(axis=1), axis=0).fillna(0)
     
     plt.figure(figsize=(12, 10))
     sns.heatmap(emotion_cross, annot=True, cmap='coolwarm', fmt='.2f', linewidths=.5)
@@ -54,151 +74,131 @@ def visualize_emotion_correlation(df):
     plt.yticks(fontsize=12, rotation=0)
     
     plt.tight_layout()
-    plt.savefig('emotion_correlation.png', dpi=300)
+    output_file = figure_path(output_dir, 'emotion_correlation', fmt)
+    plt.savefig(output_file, dpi=dpi)
     plt.close()
-    print("Saved emotion correlation heatmap as 'emotion_correlation.png'")
+    print(f"Saved emotion correlation heatmap as '{output_file}'")
+    return output_file
+
+def _format_mm_ss(seconds, _pos=None):
+    return f"{int(seconds // 60):02d}:{int(seconds % 60):02d}"
+
+def _draw_emotion_track(ax, times, labels, color_map):
+    """Draw one broken_barh per emotion for its spans plus a single scatter for the samples."""
+    spans_by_emotion = defaultdict(list)
+    for emotion, start, width in run_length_spans(times, labels):
+        spans_by_emotion[emotion].append((start, width))
+    for emotion, spans in spans_by_emotion.items():
+        ax.broken_barh(spans, (0, 1), facecolors=color_map.get(emotion, 'lightgrey'), alpha=0.7)
+
+    ax.scatter(times, np.full(len(times), 0.5), color='k', s=64, zorder=3)
+    ax.set_ylim(0, 1)
+
+    patches = [plt.Rectangle((0, 0), 1, 1, color=color) for color in color_map.values()]
+    ax.legend(patches, list(color_map), loc='upper right')
 
-def visualize_session_timeline(df, num_sessions=5):
-    """Create timeline visualizations for a few sample sessions."""
-    # Get unique session IDs
-    sessions = df['session_id'].unique()
+def render_session_timeline(session_id, times, image_labels, audio_labels, image_color_map, audio_color_map,
+                            output_dir='.', dpi=300, fmt='png'):
+    """Render and save the image/audio timeline figure for one session. Returns the file name."""
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 10), sharex=True)
+
+    _draw_emotion_track(ax1, times, image_labels, image_color_map)
+    _draw_emotion_track(ax2, times, audio_labels, audio_color_map)
+
+    # Format x-axis to show time
+    formatter = FuncFormatter(_format_mm_ss)  # Minutes:Seconds
+    ax2.xaxis.set_major_formatter(formatter)
     
-    # Sample a few sessions to visualize
-    sample_sessions = np.random.choice(sessions, min(num_sessions, len(sessions)), replace=False)
+    # Set labels and titles
+    ax1.set_title(f'Image Emotions - Session {session_id[:8]}...', fontsize=16)
+    ax1.set_ylabel('Emotion State', fontsize=14)
+    ax1.set_yticks([])
     
-    for session_id in sample_sessions:
-        # Filter data for this session
-        session_data = df[df['session_id'] == session_id].sort_values('timestamp')
-        
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 10), sharex=True)
-        
-        # Create a base date for visualization (arbitrary, just for display)
-        base_date = datetime(2023, 1, 1)
-        
-        # Convert timestamps to datetime for better x-axis formatting
-        time_points = [base_date + timedelta(seconds=float(t)) for t in session_data['timestamp']]
-        
-        # Get unique emotions for consistent coloring
-        unique_image_emotions = df['image_result'].unique()
-        unique_audio_emotions = df['audio_result'].unique()
-        
-        # Create color maps
-        image_colors = sns.color_palette("viridis", len(unique_image_emotions))
-        audio_colors = sns.color_palette("magma", len(unique_audio_emotions))
-        
-        image_color_map = dict(zip(unique_image_emotions, image_colors))
-        audio_color_map = dict(zip(unique_audio_emotions, audio_colors))
-        
-        # Plot image emotions
-        last_time = time_points[0]
-        last_emotion = session_data['image_result'].iloc[0]
-        
-        for i in range(len(time_points)):
-            current_time = time_points[i]
-            current_emotion = session_data['image_result'].iloc[i]
-            
-            # Draw rectangle for the emotion duration
-            ax1.axvspan(last_time, current_time, 
-                       color=image_color_map[last_emotion], 
-                       alpha=0.7)
-            
-            # Update for next segment
-            last_time = current_time
-            last_emotion = current_emotion
-        
-        # Plot audio emotions
-        last_time = time_points[0]
-        last_emotion = session_data['audio_result'].iloc[0]
-        
-        for i in range(len(time_points)):
-            current_time = time_points[i]
-            current_emotion = session_data['audio_result'].iloc[i]
-            
-            # Draw rectangle for the emotion duration
-            ax2.axvspan(last_time, current_time, 
-                       color=audio_color_map[last_emotion], 
-                       alpha=0.7)
-            
-            # Update for next segment
-            last_time = current_time
-            last_emotion = current_emotion
-        
-        # Add data points
-        for i, time_point in enumerate(time_points):
-            ax1.plot(time_point, 0.5, 'ko', markersize=8)
-            ax2.plot(time_point, 0.5, 'ko', markersize=8)
-        
-        # Add legend for image emotions
-        image_patches = [plt.Rectangle((0, 0), 1, 1, color=image_color_map[emotion]) 
-                         for emotion in unique_image_emotions]
-        ax1.legend(image_patches, unique_image_emotions, loc='upper right')
-        
-        # Add legend for audio emotions
-        audio_patches = [plt.Rectangle((0, 0), 1, 1, color=audio_color_map[emotion]) 
-                         for emotion in unique_audio_emotions]
-        ax2.legend(audio_patches, unique_audio_emotions, loc='upper right')
-        
-        # Format x-axis to show time
-        formatter = mdates.DateFormatter('%M:%S')  # Minutes:Seconds
-        ax1.xaxis.set_major_formatter(formatter)
-        ax2.xaxis.set_major_formatter(formatter)
-        
-        # Set labels and titles
-        ax1.set_title(f'Image Emotions - Session {session_id[:8]}...', fontsize=16)
-        ax1.set_ylabel('Emotion State', fontsize=14)
-        ax1.set_yticks([])
-        
-        ax2.set_title(f'Audio Emotions - Session {session_id[:8]}...', fontsize=16)
-        ax2.set_xlabel('Time (MM:SS)', fontsize=14)
-        ax2.set_ylabel('Emotion State', fontsize=14)
-        ax2.set_yticks([])
-        
-        plt.tight_layout()
-        plt.savefig(f'session_timeline_{session_id[:8]}.png', dpi=300)
-        plt.close()
-        print(f"Saved timeline for session {session_id[:8]}... as 'session_timeline_{session_id[:8]}.png'")
+    ax2.set_title(f'Audio Emotions - Session {session_id[:8]}...', fontsize=16)
+    ax2.set_xlabel('Time (MM:SS)', fontsize=14)
+    ax2.set_ylabel('Emotion State', fontsize=14)
+    ax2.set_yticks([])
+    
+    output_file = figure_path(output_dir, f'session_timeline_{session_id[:8]}', fmt)
+    plt.tight_layout()
+    plt.savefig(output_file, dpi=dpi)
+    plt.close(fig)
+    print(f"Saved timeline for session {session_id[:8]}... as '{output_file}'")
+    return output_file
+
+def render_session_timeline_task(task):
+    return render_session_timeline(*task)
+
+def use_agg_backend():
+    # Worker processes never show figures, so skip any GUI backend
+    import matplotlib
+    matplotlib.use('Agg')
+
+def session_timeline_tasks(df, sessions=None, output_dir='.', dpi=300, fmt='png'):
+    """Build render_session_timeline argument tuples for the given sessions (all when None)."""
+    # Consistent colors across sessions, computed once
+    unique_image_emotions = df['image_result'].dropna().unique()
+    unique_audio_emotions = df['audio_result'].dropna().unique()
+    image_color_map = dict(zip(unique_image_emotions, sns.color_palette("viridis", len(unique_image_emotions))))
+    audio_color_map = dict(zip(unique_audio_emotions, sns.color_palette("magma", len(unique_audio_emotions))))
+
+    # Group once instead of scanning the frame per session
+    selected = df if sessions is None else df[df['session_id'].isin(sessions)]
+    selected = selected.sort_values(['session_id', 'timestamp'])
+    return [
+        (str(session_id), session_data['timestamp'].to_numpy(dtype=float),
+         session_data['image_result'].to_numpy(dtype=object), session_data['audio_result'].to_numpy(dtype=object),
+         image_color_map, audio_color_map, output_dir, dpi, fmt)
+        for session_id, session_data in selected.groupby('session_id', observed=True, sort=False)
+    ]
+
+def visualize_session_timeline(df, num_sessions=5, workers=None, output_dir='.', dpi=300, fmt='png'):
+    """Create timeline visualizations for sample sessions (all sessions when num_sessions is None).
+
+    With workers > 1 the figures are rendered in parallel worker processes.
+    """
+    sessions = None
+    if num_sessions is not None:
+        # Sample a few sessions to visualize
+        unique_sessions = df['session_id'].unique()
+        sessions = np.random.choice(unique_sessions, min(num_sessions, len(unique_sessions)), replace=False)
 
-def visualize_emotion_transitions(df):
+    tasks = session_timeline_tasks(df, sessions, output_dir=output_dir, dpi=dpi, fmt=fmt)
+    if workers and workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=use_agg_backend) as pool:
+            return list(pool.map(render_session_timeline_task, tasks))
+    return [render_session_timeline(*task) for task in tasks]
+
+def compute_transitions(df, column, categories=None):
+    """Count transitions between consecutive labels of `column` within each session.
+
+    Returns a square DataFrame of counts with from-emotions as rows and
+    to-emotions as columns. Runs as one sort plus a bincount over label codes.
+    """
+    ordered = df[['session_id', 'timestamp', column]].sort_values(['session_id', 'timestamp'])
+    if categories is None:
+        categories = sorted(ordered[column].dropna().unique())
+    k = len(categories)
+
+    codes = pd.Categorical(ordered[column], categories=categories).codes.astype(np.int64)
+    sessions = pd.factorize(ordered['session_id'])[0]
+
+    # A transition is a pair of neighbouring rows in the same session with known labels
+    valid = (sessions[1:] == sessions[:-1]) & (codes[1:] >= 0) & (codes[:-1] >= 0)
+    pairs = codes[:-1][valid] * k + codes[1:][valid]
+    counts = np.bincount(pairs, minlength=k * k).reshape(k, k)
+    return pd.DataFrame(counts, index=categories, columns=categories)
+
+def visualize_emotion_transitions(df, output_dir='.', dpi=300, fmt='png'):
     """Create transition matrices showing how emotions change over time."""
+    return plot_emotion_transitions(compute_transitions(df, 'image_result'),
+                                    compute_transitions(df, 'audio_result'),
+                                    output_dir=output_dir, dpi=dpi, fmt=fmt)
+
+def plot_emotion_transitions(image_matrix, audio_matrix, output_dir='.', dpi=300, fmt='png'):
+    """Draw the transition heatmaps from raw transition count matrices."""
     plt.figure(figsize=(20, 10))
     
-    # Process image emotion transitions
-    image_transitions = defaultdict(lambda: defaultdict(int))
-    audio_transitions = defaultdict(lambda: defaultdict(int))
-    
-    # Group by session to track transitions within each session
-    for session_id in df['session_id'].unique():
-        session_data = df[df['session_id'] == session_id].sort_values('timestamp')
-        
-        # Process image emotions
-        prev_image = None
-        for emotion in session_data['image_result']:
-            if prev_image is not None:
-                image_transitions[prev_image][emotion] += 1
-            prev_image = emotion
-        
-        # Process audio emotions
-        prev_audio = None
-        for emotion in session_data['audio_result']:
-            if prev_audio is not None:
-                audio_transitions[prev_audio][emotion] += 1
-            prev_audio = emotion
-    
-    # Convert to DataFrames for visualization
-    image_emotions = sorted(df['image_result'].unique())
-    audio_emotions = sorted(df['audio_result'].unique())
-    
-    image_matrix = pd.DataFrame(0, index=image_emotions, columns=image_emotions)
-    audio_matrix = pd.DataFrame(0, index=audio_emotions, columns=audio_emotions)
-    
-    for from_emotion, transitions in image_transitions.items():
-        for to_emotion, count in transitions.items():
-            image_matrix.at[from_emotion, to_emotion] = count
-    
-    for from_emotion, transitions in audio_transitions.items():
-        for to_emotion, count in transitions.items():
-            audio_matrix.at[from_emotion, to_emotion] = count
-    
     # Normalize by row (from each starting emotion)
     image_matrix = image_matrix.div(image_matrix.sum(axis=1), axis=0).fillna(0)
     audio_matrix = audio_matrix.div(audio_matrix.sum(axis=1), axis=0).fillna(0)
@@ -217,18 +217,24 @@ def visualize_emotion_transitions(df):
     plt.ylabel('From Emotion', fontsize=14)
     
     plt.tight_layout()
-    plt.savefig('emotion_transitions.png', dpi=300)
+    output_file = figure_path(output_dir, 'emotion_transitions', fmt)
+    plt.savefig(output_file, dpi=dpi)
     plt.close()
-    print("Saved emotion transitions as 'emotion_transitions.png'")
+    print(f"Saved emotion transitions as '{output_file}'")
+    return output_file
 
-def visualize_session_statistics(df):
+def visualize_session_statistics(df, output_dir='.', dpi=300, fmt='png'):
     """Visualize statistics about session length and number of data points."""
     # Calculate session statistics
-    session_stats = df.groupby('session_id').agg(
+    session_stats = df.groupby('session_id', observed=True).agg(
         max_timestamp=('timestamp', 'max'),
         num_points=('timestamp', 'count')
     ).reset_index()
-    
+    return plot_session_statistics(session_stats, output_dir=output_dir, dpi=dpi, fmt=fmt)
+
+def plot_session_statistics(session_stats, output_dir='.', dpi=300, fmt='png'):
+    """Draw the session histograms from per-session max_timestamp and num_points."""
+    session_stats = session_stats.copy()
     session_stats['session_duration_min'] = session_stats['max_timestamp'] / 60  # Convert to minutes
     
     plt.figure(figsize=(15, 10))
@@ -250,30 +256,52 @@ def visualize_session_statistics(df):
     plt.grid(linestyle='--', alpha=0.7)
     
     plt.tight_layout()
-    plt.savefig('session_statistics.png', dpi=300)
+    output_file = figure_path(output_dir, 'session_statistics', fmt)
+    plt.savefig(output_file, dpi=dpi)
     plt.close()
-    print("Saved session statistics as 'session_statistics.png'")
+    print(f"Saved session statistics as '{output_file}'")
+    return output_file
 
 def main():
+    import argparse
+    from report_builder import PRESETS, build_report
+
+    parser = argparse.ArgumentParser(description="Build the emotion report figures.")
     # Replace with your CSV file path
-    file_path = 'result_populated.csv'
+    parser.add_argument("file_path", nargs="?", default='result_populated.csv')
+    parser.add_argument("--output-dir", default='.')
+    parser.add_argument("--preset", choices=PRESETS, default="print",
+                        help="output format/DPI preset (preview is much faster)")
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: all cores)")
+    parser.add_argument("--timeline-sessions", type=int, default=3,
+                        help="number of sampled session timelines; 0 renders every session")
+    parser.add_argument("--force", action="store_true", help="re-render figures even if their inputs are unchanged")
+    parser.add_argument("--chunked", action="store_true",
+                        help="stream the archive in chunks for the aggregate figures (no timelines, bounded memory)")
+    parser.add_argument("--summary", default=None,
+                        help="draw the aggregate figures from this session summary database instead of the raw rows")
+    args = parser.parse_args()
     
     try:
-        # Load data
-        df = load_data(file_path)
-        print(f"Loaded {len(df)} data points from {len(df['session_id'].unique())} sessions")
-        
-        # Create visualizations
-        visualize_emotion_distribution(df)
-        visualize_emotion_correlation(df)
-        visualize_session_timeline(df, num_sessions=3)
-        visualize_emotion_transitions(df)
-        visualize_session_statistics(df)
+        if args.summary:
+            from session_summary import render_summary_figures
+            render_summary_figures(args.summary, output_dir=args.output_dir, **PRESETS[args.preset])
+            return
+
+        if args.chunked:
+            from archive_loader import render_archive_figures
+            render_archive_figures(args.file_path, output_dir=args.output_dir, **PRESETS[args.preset])
+            return
+
+        # The most recently appended sessions; build_report only reads the archive to pick them when it changed
+        rendered, skipped = build_report(args.file_path, output_dir=args.output_dir, workers=args.workers,
+                                         recent_sessions=args.timeline_sessions or None, force=args.force,
+                                         **PRESETS[args.preset])
         
-        print("\nAll visualizations have been created successfully!")
+        print(f"\nRendered {len(rendered)} figures, {len(skipped)} were already up to date.")
         
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()